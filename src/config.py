@@ -1,10 +1,14 @@
 from dataclasses import dataclass, field
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, Literal, Optional, Tuple
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class Config:
-    """Application configuration."""
+    """Application configuration.
+
+    Immutable: build a variant with ``dataclasses.replace(config, ...)``.
+    Collection fields are tuples so a Config can be shared freely between modes and workers.
+    """
     input_dir: str = "input"
     xlsx_output_dir: str = "output/xlsx"
     kml_output_dir: str = "output/kml"
@@ -14,6 +18,18 @@ class Config:
     merge_columns: Tuple[int, int] = (1, 7)  # Columns A-G
     # None = auto-detect based on CPU count
     max_parallel_workers: Optional[int] = None
+    # Files a worker process converts before it is replaced (bounds openpyxl memory growth).
+    # None = never recycle. Requires Python 3.11+; ignored on older versions.
+    max_tasks_per_worker: Optional[int] = 20
+    # "process" or "thread". openpyxl parsing is mostly pure Python and holds the GIL,
+    # so processes scale better; threads avoid pickling and per-process memory.
+    executor_kind: Literal["process", "thread"] = "process"
+    # Runs with at most this many files are converted in the main process, without a pool
+    inline_conversion_max_files: int = 2
+    # SQLite file listing converted files; a later demo-maps run (mode 3) skips inputs that
+    # have not changed. Mode 1 rewrites every region XLSX first, so it always converts them all.
+    # None = convert every file on every run
+    conversion_manifest_path: Optional[str] = None
 
     # Projections / parsing
     proj4_path: str = "data/proj4.json"
@@ -21,22 +37,20 @@ class Config:
 
     # Excel parsing configuration
     # Map of semantic column keys to possible header names (synonyms)
-    excel_columns: Dict[str, List[str]] = field(default_factory=lambda: {
-        "name": ["№ п/п"],
-        "coord": ["Место водопользования"],
-        "organ": ["Уполномоченный орган"],
-        "additional_name": ["Наименование водного объекта"],
-        "goal": ["Цель водопользования"],
-        "vid": ["Вид водопользования"],
-        "owner": ["Наименование"],
-        "inn": ["ИНН"],
-        "start_date": ["Дата начала водопользования"],
-        "end_date": ["Дата окончания водопользования", "Дата прекращения действия"],
+    excel_columns: Dict[str, Tuple[str, ...]] = field(default_factory=lambda: {
+        "name": ("№ п/п",),
+        "coord": ("Место водопользования",),
+        "organ": ("Уполномоченный орган",),
+        "additional_name": ("Наименование водного объекта",),
+        "goal": ("Цель водопользования",),
+        "vid": ("Вид водопользования",),
+        "owner": ("Наименование",),
+        "inn": ("ИНН",),
+        "start_date": ("Дата начала водопользования",),
+        "end_date": ("Дата окончания водопользования", "Дата прекращения действия"),
     })
     # Which keys require exact header match
-    excel_exact_match_keys: List[str] = field(default_factory=lambda: [
-        "owner",
-    ])
+    excel_exact_match_keys: Tuple[str, ...] = ("owner",)
     # Heuristic to detect the first data row by scanning for markers in early rows
     excel_header_scan_min_row: int = 2
     excel_header_scan_max_row: int = 5
@@ -49,7 +63,7 @@ class Config:
     kml_polygon_line_width: int = 3
     kml_polygon_alpha: int = 100  # 0..255
     # Business rules
-    pipeline_skip_terms: List[str] = field(default_factory=lambda: [
+    pipeline_skip_terms: Tuple[str, ...] = (
         "Сброс сточных",
         "Забор (изъятие)",
-    ])
+    )
@@ -1,12 +1,12 @@
 import logging
-from typing import Any, List, Optional, Tuple, cast
+from typing import Any, Callable, Dict, List, Optional, Tuple, cast
 
-from rich.console import Console
+from rich.console import Console, Group
 from rich.panel import Panel
 from rich.prompt import Prompt
 from rich.table import Table
+from rich.text import Text
 
-from src.utils import setup_logging
 from src.xlsx_to_kml import (
     parse_coordinates,
     process_coordinates,
@@ -16,48 +16,91 @@ from src.xlsx_to_kml import (
 )
 from src.config import Config
 from pyproj import Transformer
-from src.xlsx_to_kml.parsing import parse_dms_coordinates, transform_points_sk42_to_wgs84
+from src.xlsx_to_kml.parsing import looks_like_msk, parse_dms_coordinates, transform_points_sk42_to_wgs84
 
 
 console = Console()
 logger = logging.getLogger(__name__)
 
+# Слова для возврата на предыдущий шаг и обязательный префикс proj4-строки
+_BACK_WORDS = frozenset(("back", "назад"))
+_PROJ4_PREFIX = "+proj"
+# Формат координат в таблице результатов (спецификация разбирается один раз)
+_format_coord = "{:.6f}".format
+
+# Статичные элементы интерфейса: собираются один раз при импорте модуля
+_DEBUG_INTRO_PANEL = Panel(
+    "[bold magenta]Режим отладки парсера координат[/bold magenta]\n"
+    "[dim]Введите строки для парсинга координат и тестирования различных proj4 систем[/dim]",
+    title="🔧 Отладка",
+    border_style="magenta"
+)
+
+_PROJ4_HELP_PANEL = Panel(
+    "[bold cyan]Ввод собственной proj4 строки[/bold cyan]\n\n"
+    "Введите proj4 строку для преобразования координат МСК.\n\n"
+    "[dim]Пример:[/dim]\n"
+    "[yellow]+proj=tmerc +lat_0=0 +lon_0=130.71666666667 +k=1 +x_0=4300000 +y_0=-16586.442 +ellps=krass +units=m +no_defs[/yellow]",
+    title="Настройка proj4",
+    border_style="cyan"
+)
+
+_NO_COORDS_PANEL = Panel(
+    "[yellow]Координаты не найдены или являются нулевыми.[/yellow]",
+    title="⚠️ Результат парсинга",
+    border_style="yellow"
+)
+
+# Подсказки ввода разбираются из разметки один раз, а не на каждой итерации цикла
+_PARSE_PROMPT = Text.from_markup("[bold cyan]Строка для парсинга[/bold cyan]")
+_PROJ4_PROMPT = Text.from_markup("\n[bold]Proj4 строка[/bold]")
+
+_MODE_TABLE = Table(title="Режимы парсинга", show_header=False, box=None)
+_MODE_TABLE.add_column("№", style="bold cyan", width=3)
+_MODE_TABLE.add_column("Описание", style="white")
+_MODE_TABLE.add_row("1", "Автоматический режим (как в основной программе)")
+_MODE_TABLE.add_row("2", "Ввести собственную proj4 строку")
+_MODE_TABLE.add_row("3", "СК-42 -> WGS-84")
+_MODE_TABLE.add_row("4", "Вернуться в главное меню")
+
+
+# Обработчик консоли ищется в корневом логгере один раз и затем переиспользуется
+_ROOT_LOGGER = logging.getLogger()
+_console_handler: Optional[logging.Handler] = None
+
+
+def _find_console_handler() -> Optional[logging.Handler]:
+    global _console_handler
+    if _console_handler is None or _console_handler not in _ROOT_LOGGER.handlers:
+        _console_handler = next(
+            (h for h in _ROOT_LOGGER.handlers if isinstance(h, logging.StreamHandler)), None)
+    return _console_handler
+
 
 def _setup_debug_logging():
-    root_logger = logging.getLogger()
-    console_handler = None
+    console_handler = _find_console_handler()
     original_console_level = None
 
-    for handler in root_logger.handlers:
-        if isinstance(handler, logging.StreamHandler):
-            console_handler = handler
-            original_console_level = handler.level
-            handler.setLevel(logging.DEBUG)
+    if console_handler is not None:
+        original_console_level = console_handler.level
+        console_handler.setLevel(logging.DEBUG)
+        if logger.isEnabledFor(logging.DEBUG):
             logger.debug(
                 "Установлен DEBUG уровень логирования для консоли в режиме отладки")
-            break
 
     return console_handler, original_console_level
 
 
 def _cleanup_debug_logging(console_handler: Optional[logging.Handler], original_console_level: Optional[int]):
     if console_handler and original_console_level is not None:
-        logger.debug(
-            f"Восстановлен исходный уровень логирования консоли: {logging.getLevelName(original_console_level)}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Восстановлен исходный уровень логирования консоли: %s",
+                         logging.getLevelName(original_console_level))
         console_handler.setLevel(original_console_level)
 
 
 def _get_debug_mode_choice() -> str:
-    mode_table = Table(title="Режимы парсинга", show_header=False, box=None)
-    mode_table.add_column("№", style="bold cyan", width=3)
-    mode_table.add_column("Описание", style="white")
-
-    mode_table.add_row("1", "Автоматический режим (как в основной программе)")
-    mode_table.add_row("2", "Ввести собственную proj4 строку")
-    mode_table.add_row("3", "СК-42 -> WGS-84")
-    mode_table.add_row("4", "Вернуться в главное меню")
-
-    console.print(mode_table)
+    console.print(_MODE_TABLE)
 
     try:
         return Prompt.ask(
@@ -72,19 +115,12 @@ def _get_debug_mode_choice() -> str:
 
 
 def _get_custom_proj4_transformer() -> Tuple[Optional[Any], Optional[str]]:
-    console.print(Panel(
-        "[bold cyan]Ввод собственной proj4 строки[/bold cyan]\n\n"
-        "Введите proj4 строку для преобразования координат МСК.\n\n"
-        "[dim]Пример:[/dim]\n"
-        "[yellow]+proj=tmerc +lat_0=0 +lon_0=130.71666666667 +k=1 +x_0=4300000 +y_0=-16586.442 +ellps=krass +units=m +no_defs[/yellow]",
-        title="Настройка proj4",
-        border_style="cyan"
-    ))
+    console.print(_PROJ4_HELP_PANEL)
 
     while True:
         try:
             custom_proj4 = Prompt.ask(
-                "\n[bold]Proj4 строка[/bold]",
+                _PROJ4_PROMPT,
                 default="",
                 show_default=False
             ).strip()
@@ -93,10 +129,10 @@ def _get_custom_proj4_transformer() -> Tuple[Optional[Any], Optional[str]]:
                 console.print("[yellow]Ввод не может быть пустым.[/yellow]")
                 continue
 
-            if custom_proj4.lower() in ["back", "назад"]:
+            if custom_proj4.casefold() in _BACK_WORDS:
                 return None, None
 
-            if not custom_proj4.startswith('+proj'):
+            if not custom_proj4.startswith(_PROJ4_PREFIX):
                 console.print(
                     "[yellow]Proj4 строка должна начинаться с '+proj'.[/yellow]")
                 continue
@@ -123,37 +159,48 @@ def _get_custom_proj4_transformer() -> Tuple[Optional[Any], Optional[str]]:
             continue
 
 
-def _parse_coordinate_string(input_string: str, mode_choice: str, selected_transformer: Optional[Any]):
-    logger.info(f"--- Начало парсинга строки: '{input_string}' ---")
+def _parse_auto(input_string: str, selected_transformer: Optional[Any], config: Config) -> List[Point]:
+    return parse_coordinates(input_string, config=config)
+
+
+def _parse_custom_proj4(input_string: str, selected_transformer: Optional[Any], config: Config) -> List[Point]:
+    if looks_like_msk(input_string):
+        if selected_transformer is None:
+            raise ParseError(
+                "Не задан трансформер Proj4 для режима МСК.")
+        return process_coordinates(
+            input_string, cast(Transformer, selected_transformer), config=config)
+    return parse_coordinates(input_string, config=config)
+
+
+def _parse_sk42(input_string: str, selected_transformer: Optional[Any], config: Config) -> List[Point]:
+    # СК-42 -> WGS-84: парсим ДМС и применяем готовый хелпер трансформации
+    dms_points: List[Point] = parse_dms_coordinates(input_string)
+    if not dms_points:
+        return []
+    return transform_points_sk42_to_wgs84(dms_points)
+
+
+# Обработчики режимов парсинга по номеру пункта меню
+_MODE_HANDLERS: Dict[str, Callable[[str, Optional[Any], Config], List[Point]]] = {
+    "1": _parse_auto,
+    "2": _parse_custom_proj4,
+    "3": _parse_sk42,
+}
+
 
+def _parse_coordinate_string(input_string: str, mode_choice: str, selected_transformer: Optional[Any], config: Config):
+    if logger.isEnabledFor(logging.INFO):
+        logger.info("--- Начало парсинга строки: '%s' ---", input_string)
+
+    handler = _MODE_HANDLERS.get(mode_choice)
+    if handler is None:
+        return None, "Неизвестный режим парсинга"
     try:
-        if mode_choice == "1":
-            coords: List[Point] = parse_coordinates(
-                input_string, config=Config())
-            return coords, None
-        elif mode_choice == "2":
-            if (' м.' in input_string or ', м.' in input_string or input_string.endswith('м.')) and '°' not in input_string:
-                if selected_transformer is None:
-                    raise ParseError(
-                        "Не задан трансформер Proj4 для режима МСК.")
-                coords = process_coordinates(
-                    input_string, cast(Transformer, selected_transformer), config=Config())
-                return coords, None
-            else:
-                coords = parse_coordinates(input_string, config=Config())
-                return coords, None
-        elif mode_choice == "3":
-            # СК-42 -> WGS-84: парсим ДМС и применяем готовый хелпер трансформации
-            dms_points: List[Point] = parse_dms_coordinates(input_string)
-            if not dms_points:
-                return [], None
-            transformed = transform_points_sk42_to_wgs84(dms_points)
-            return transformed, None
+        return handler(input_string, selected_transformer, config), None
     except ParseError as e:
         return None, str(e)
 
-    return None, "Неизвестный режим парсинга"
-
 
 def _display_parsing_results(coords, reason):
     if reason:
@@ -163,11 +210,7 @@ def _display_parsing_results(coords, reason):
             border_style="red"
         ))
     elif not coords:
-        console.print(Panel(
-            "[yellow]Координаты не найдены или являются нулевыми.[/yellow]",
-            title="⚠️ Результат парсинга",
-            border_style="yellow"
-        ))
+        console.print(_NO_COORDS_PANEL)
     else:
         result_table = Table(
             title=f"✅ Найдено {len(coords)} координат", show_header=True, header_style="bold green")
@@ -176,19 +219,23 @@ def _display_parsing_results(coords, reason):
         result_table.add_column("Долгота", style="green", justify="right")
         result_table.add_column("Широта", style="green", justify="right")
 
-        for i, p in enumerate(coords, 1):
+        row_numbers = map(str, range(1, len(coords) + 1))
+        for row_number, (name, lon, lat) in zip(row_numbers, coords):
             result_table.add_row(
-                str(i), p.name, f"{p.lon:.6f}", f"{p.lat:.6f}")
-
-        console.print(result_table)
-        console.print("\n[bold blue]📍 Формат для Geobridge:[/bold blue]")
-        for p in coords:
-            console.print(f"{p.lat}, {p.lon}")
+                row_number, name, _format_coord(lon), _format_coord(lat))
+
+        # Таблица и блок для Geobridge выводятся одним вызовом console.print
+        geobridge_lines = "\n".join(f"{lat}, {lon}" for _, lon, lat in coords)
+        console.print(Group(
+            result_table,
+            "\n[bold blue]📍 Формат для Geobridge:[/bold blue]",
+            geobridge_lines,
+        ))
 
     console.print()
 
 
-def _run_coordinate_parsing_loop(mode_choice: str, selected_transformer, selected_proj4_name):
+def _run_coordinate_parsing_loop(mode_choice: str, selected_transformer, selected_proj4_name, config: Config):
     if mode_choice == '1':
         mode_text = 'Автоматический'
     elif mode_choice == '2':
@@ -208,17 +255,16 @@ def _run_coordinate_parsing_loop(mode_choice: str, selected_transformer, selecte
 
     while True:
         try:
-            input_string = Prompt.ask(
-                "[bold cyan]Строка для парсинга[/bold cyan]")
+            input_string = Prompt.ask(_PARSE_PROMPT)
 
-            if input_string.lower() in ["back", "назад"]:
+            if input_string.casefold() in _BACK_WORDS:
                 break
 
             if not input_string.strip():
                 continue
 
             coords, reason = _parse_coordinate_string(
-                input_string, mode_choice, selected_transformer)
+                input_string, mode_choice, selected_transformer, config)
             _display_parsing_results(coords, reason)
 
         except (KeyboardInterrupt, EOFError):
@@ -226,13 +272,10 @@ def _run_coordinate_parsing_loop(mode_choice: str, selected_transformer, selecte
             break
 
 
-def debug_coordinate_parser() -> None:
-    console.print(Panel(
-        "[bold magenta]Режим отладки парсера координат[/bold magenta]\n"
-        "[dim]Введите строки для парсинга координат и тестирования различных proj4 систем[/dim]",
-        title="🔧 Отладка",
-        border_style="magenta"
-    ))
+def debug_coordinate_parser(config: Optional[Config] = None) -> None:
+    if config is None:
+        config = Config()
+    console.print(_DEBUG_INTRO_PANEL)
 
     console_handler, original_console_level = _setup_debug_logging()
 
@@ -252,7 +295,7 @@ def debug_coordinate_parser() -> None:
                     continue
 
             _run_coordinate_parsing_loop(
-                mode_choice, selected_transformer, selected_proj4_name)
+                mode_choice, selected_transformer, selected_proj4_name, config)
 
     except (KeyboardInterrupt, EOFError):
         console.print(
@@ -2,11 +2,10 @@ import logging
 import multiprocessing
 from rich import traceback
 
-from src.utils import setup_logging
+from src.utils import console_log_level, setup_logging
 from src.config import Config
 from src.ui import console, display_welcome, show_main_menu
-from src.processing import process_mode_1_full_processing, process_mode_2_single_file, process_mode_3_demo_maps
-from src.debug_parser import debug_coordinate_parser
+# Processing modes (openpyxl, pyproj, simplekml) are imported when their menu item is chosen
 
 
 # Better tracebacks
@@ -33,39 +32,19 @@ def main() -> None:
             break
 
         if user_input == "1":
+            from src.processing import process_mode_1_full_processing
             process_mode_1_full_processing(config)
         elif user_input == "2":
-            # Temporarily elevate console log level to INFO for Mode 2
-            root_logger = logging.getLogger()
-            previous_levels = []
-            for handler in root_logger.handlers:
-                if isinstance(handler, logging.StreamHandler):
-                    previous_levels.append((handler, handler.level))
-                    handler.setLevel(logging.INFO)
-
-            try:
+            from src.processing import process_mode_2_single_file
+            with console_log_level(logging.INFO):
                 process_mode_2_single_file(config)
-            finally:
-                # Restore previous console handler levels
-                for handler, level in previous_levels:
-                    handler.setLevel(level)
         elif user_input == "3":
-            # Temporarily elevate console log level to INFO for Mode 3 (Demo maps)
-            root_logger = logging.getLogger()
-            previous_levels = []
-            for handler in root_logger.handlers:
-                if isinstance(handler, logging.StreamHandler):
-                    previous_levels.append((handler, handler.level))
-                    handler.setLevel(logging.INFO)
-
-            try:
+            from src.processing import process_mode_3_demo_maps
+            with console_log_level(logging.INFO):
                 process_mode_3_demo_maps(config)
-            finally:
-                # Restore previous console handler levels
-                for handler, level in previous_levels:
-                    handler.setLevel(level)
         elif user_input == "4":
-            debug_coordinate_parser()
+            from src.debug_parser import debug_coordinate_parser
+            debug_coordinate_parser(config)
         elif user_input == "5":
             from rich.panel import Panel
 
@@ -0,0 +1,121 @@
+import dataclasses
+import hashlib
+import logging
+import os
+import sqlite3
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from src.config import Config
+from src.xlsx_to_kml import parsing
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS conversions (
+    kml_path TEXT PRIMARY KEY,
+    xlsx_path TEXT NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    demo_percentage REAL,
+    settings TEXT NOT NULL
+)
+"""
+
+# Config fields that only decide where and how conversion runs, not what the KML contains
+_NON_OUTPUT_FIELDS = frozenset({
+    "input_dir", "xlsx_output_dir", "kml_output_dir", "single_kml_output_dir", "demo_kml_output_dir",
+    "max_parallel_workers", "max_tasks_per_worker", "executor_kind", "inline_conversion_max_files",
+    "conversion_manifest_path",
+})
+
+
+def _file_state(path: str) -> Tuple[str, Optional[int], Optional[int]]:
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return path, None, None
+    return path, stat.st_mtime_ns, stat.st_size
+
+
+def settings_fingerprint(config: Config) -> str:
+    """Hashes everything besides the XLSX itself that shapes the KML.
+
+    That is the output-relevant Config fields, the projection and SK-42 reference
+    files, and the converter sources (by mtime and size).
+    """
+    output_fields = [(f.name, getattr(config, f.name)) for f in dataclasses.fields(config)
+                     if f.name not in _NON_OUTPUT_FIELDS]
+    converter_dir = os.path.dirname(parsing.__file__)
+    inputs = [config.proj4_path, parsing.OBJECTS_INFO_YAML_PATH, parsing.OBJECTS_INFO_JSON_PATH]
+    inputs += sorted(os.path.join(converter_dir, name)
+                     for name in os.listdir(converter_dir) if name.endswith(".py"))
+    state = (output_fields, [_file_state(path) for path in inputs])
+    return hashlib.sha1(repr(state).encode("utf-8")).hexdigest()
+
+
+class ConversionManifest:
+    """SQLite record of converted files, used to skip inputs that have not changed since.
+
+    A KML is reused when its XLSX has the same mtime and size, it was built with the same
+    settings (see settings_fingerprint, plus the demo percentage) and the KML file still exists.
+    """
+
+    def __init__(self, db_path: str, config: Config) -> None:
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._connection = sqlite3.connect(db_path)
+        self._connection.execute(_SCHEMA)
+        self._settings = settings_fingerprint(config)
+        # Input state seen before conversion, recorded for the files that convert successfully
+        self._pending_state: Dict[str, Tuple[str, int, int, Optional[float]]] = {}
+
+    def pending(self, worker_args: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Returns the worker args whose KML has to be (re)built."""
+        # One query for the whole table: it only holds this project's outputs
+        known = {
+            row[0]: row[1:]
+            for row in self._connection.execute(
+                "SELECT kml_path, xlsx_path, mtime_ns, size, demo_percentage, settings FROM conversions")
+        }
+        pending_args = []
+        for args in worker_args:
+            xlsx_path = args['xlsx_file_path']
+            kml_path = args['kml_file_path']
+            try:
+                stat = os.stat(xlsx_path)
+            except OSError:
+                pending_args.append(args)
+                continue
+            state = (xlsx_path, stat.st_mtime_ns, stat.st_size, args.get('demo_percentage'))
+            if known.get(kml_path) == (*state, self._settings) and os.path.exists(kml_path):
+                continue
+            self._pending_state[kml_path] = state
+            pending_args.append(args)
+        return pending_args
+
+    def record(self, kml_paths: Iterable[str]) -> None:
+        """Stores the converted files in one transaction."""
+        rows = [(kml_path, *self._pending_state[kml_path], self._settings)
+                for kml_path in kml_paths if kml_path in self._pending_state]
+        try:
+            with self._connection:
+                self._connection.executemany(
+                    "INSERT OR REPLACE INTO conversions VALUES (?, ?, ?, ?, ?, ?)", rows)
+        except sqlite3.Error as e:
+            logger.warning(f"Не удалось обновить манифест конвертации: {e}")
+
+    def close(self) -> None:
+        self._connection.close()
+
+
+def open_manifest(config: Config) -> Optional[ConversionManifest]:
+    """Opens the manifest configured in ``config``; None when it is disabled or unusable."""
+    if not config.conversion_manifest_path:
+        return None
+    try:
+        return ConversionManifest(config.conversion_manifest_path, config)
+    except (OSError, sqlite3.Error) as e:
+        logger.warning(
+            f"Манифест конвертации '{config.conversion_manifest_path}' недоступен, все файлы будут обработаны: {e}")
+        return None
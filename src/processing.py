@@ -1,33 +1,78 @@
+import atexit
 import logging
+import logging.handlers
 import multiprocessing
-from concurrent.futures import ProcessPoolExecutor, as_completed
+import os
+import queue
+import sys
+from contextlib import nullcontext
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+from itertools import chain, islice
 from pathlib import Path
-from typing import Any, Dict, List, Tuple, Optional
+from typing import Any, Callable, Dict, Iterator, List, Sequence, Tuple, Optional
 
+from openpyxl import load_workbook
 from rich.console import Console
 from rich.panel import Panel
 from rich.progress import Progress, BarColumn, TextColumn, TimeRemainingColumn, SpinnerColumn
+from rich.table import Table
+from rich.text import Text
 
 from src.config import Config
 from src.stats import ProcessingStats, display_processing_statistics
 from src.ui import console, choose_file, choose_demo_files_mode, choose_demo_percentage
-from src.separator import split_excel_file_by_merges
-from src.workers import initialize_worker_logging, process_file_worker
+from src.separator import MAX_PENDING_WRITES, split_excel_file_by_merges
+from src.manifest import open_manifest
+from src.utils import XLSX_READ_BUFFER_SIZE, console_log_level, find_xlsx_files, start_worker_log_listener
+from src.workers import (cached_transformers, initialize_worker, process_demo_file_worker,
+                         process_demo_file_worker_unpack, process_file_worker_unpack)
+from src.xlsx_to_kml import create_kml_from_coordinates
 from src.xlsx_to_kml.models import ConversionResult
 
 
 logger = logging.getLogger(__name__)
 
-
-def process_mode_1_full_processing(config: Config) -> None:
-    console.print(Panel(
+# Static mode messages: markup is parsed once at import, not on every run
+_MODE_1_INTRO_PANEL = Panel(
+    Text.from_markup(
         "[bold cyan]Режим: Разделение файла и преобразование в KML[/bold cyan]\n\n"
         "[dim]Этот режим выполнит полный цикл обработки:\n"
         "1. Разделение файла по регионам\n"
-        "2. Преобразование каждого региона в KML[/dim]",
-        title="🔄 Полная обработка",
-        border_style="cyan"
-    ))
+        "2. Преобразование каждого региона в KML[/dim]"),
+    title="🔄 Полная обработка",
+    border_style="cyan"
+)
+_STAGE_1_START_TEXT = Text.from_markup(
+    "[cyan]🔄 Этап 1: Разделение файла по регионам...[/cyan]")
+_STAGE_2_INTRO_PANEL = Panel(
+    Text.from_markup(
+        "[bold cyan]Этап 2: Преобразование разделенных файлов в KML[/bold cyan]\n\n"
+        "[dim]Поиск разделенных файлов и преобразование в формат KML...[/dim]"),
+    title="🔄 Этап 2",
+    border_style="cyan"
+)
+_MODE_2_INTRO_PANEL = Panel(
+    Text.from_markup(
+        "[bold cyan]Режим: Преобразование одного файла .xlsx в .kml[/bold cyan]\n\n"
+        "[dim]Быстрое преобразование одного файла Excel в формат KML\n"
+        "без разделения по регионам.[/dim]"),
+    title="🚀 Быстрое преобразование",
+    border_style="cyan"
+)
+_MODE_3_INTRO_PANEL = Panel(
+    Text.from_markup(
+        "[bold cyan]Режим: Создание демо-карт[/bold cyan]\n\n"
+        "[dim]Создание демо-версий KML карт с ограниченным количеством объектов\n"
+        "из разделенных файлов xlsx.[/dim]"),
+    title="🎨 Создание демо-карт",
+    border_style="cyan"
+)
+
+
+def process_mode_1_full_processing(config: Config) -> None:
+    console.print(_MODE_1_INTRO_PANEL)
 
     input_file = choose_file(config)
     if not input_file:
@@ -37,21 +82,45 @@ def process_mode_1_full_processing(config: Config) -> None:
 
     processing_stats = ProcessingStats()
 
+    # Region files are handed to the worker pool as soon as the splitter saves them,
+    # so conversion overlaps with the rest of stage 1
+    early_results: Dict[str, Future] = {}
+    on_file_written = _make_early_submitter(early_results, config)
+    # The same pool also writes the region files while the splitter keeps reading
+    max_workers = _configured_max_workers(config)
+    if max_workers > 1:
+        write_executor = _get_executor(max_workers, config)
+        max_pending_writes = max_workers * _INFLIGHT_TASKS_PER_WORKER
+    else:
+        write_executor, max_pending_writes = None, MAX_PENDING_WRITES
+
     # Stage 1: Separation
-    separation_success = _process_file_separation(
-        input_file, input_filename, processing_stats, config)
+    separation_success, separated_files = _process_file_separation(
+        input_file, input_filename, processing_stats, config, on_file_written, write_executor,
+        max_pending_writes)
 
     # Stage 2: KML Conversion
     if separation_success:
-        _process_kml_conversion(processing_stats, config)
+        _process_kml_conversion(
+            separated_files, processing_stats, config, early_results)
         display_processing_statistics(processing_stats)
         _log_processing_summary(processing_stats)
+    else:
+        for future in early_results.values():
+            future.cancel()
+        # The pool may have broken while writing regions; the next run builds a fresh one
+        if write_executor is not None:
+            _shutdown_executor()
 
 
-def _process_file_separation(input_file: str, input_filename: str, processing_stats: ProcessingStats, config: Config) -> bool:
+def _process_file_separation(input_file: str, input_filename: str, processing_stats: ProcessingStats, config: Config,
+                             on_file_written: Optional[Callable[[Path], None]] = None,
+                             write_executor: Optional[Executor] = None,
+                             max_pending_writes: int = MAX_PENDING_WRITES) -> Tuple[bool, List[Path]]:
     separation_success = False
+    separated_files: List[Path] = []
 
-    console.print("[cyan]🔄 Этап 1: Разделение файла по регионам...[/cyan]")
+    console.print(_STAGE_1_START_TEXT)
 
     try:
         Path(config.xlsx_output_dir).mkdir(parents=True, exist_ok=True)
@@ -62,12 +131,16 @@ def _process_file_separation(input_file: str, input_filename: str, processing_st
             input_path=input_file,
             output_base_dir=config.xlsx_output_dir,
             header_rows_count=config.header_rows_count,
-            merge_cols=config.merge_columns
+            merge_cols=config.merge_columns,
+            on_file_written=on_file_written,
+            write_executor=write_executor,
+            max_pending_writes=max_pending_writes
         )
 
-        separated_files = list(Path(config.xlsx_output_dir).rglob('*.xlsx'))
+        created_paths = find_xlsx_files(config.xlsx_output_dir)
+        separated_files = [Path(p) for p in created_paths]
         processing_stats.regions_detected = len(separated_files)
-        processing_stats.files_created = [str(f) for f in separated_files]
+        processing_stats.files_created = created_paths
 
         separation_success = True
 
@@ -90,19 +163,14 @@ def _process_file_separation(input_file: str, input_filename: str, processing_st
             border_style="green"
         ))
 
-    return separation_success
-
+    return separation_success, separated_files
 
-def _process_kml_conversion(processing_stats: ProcessingStats, config: Config) -> None:
-    console.print(Panel(
-        "[bold cyan]Этап 2: Преобразование разделенных файлов в KML[/bold cyan]\n\n"
-        "[dim]Поиск разделенных файлов и преобразование в формат KML...[/dim]",
-        title="🔄 Этап 2",
-        border_style="cyan"
-    ))
 
-    separated_files = list(Path(config.xlsx_output_dir).rglob('*.xlsx'))
+def _process_kml_conversion(separated_files: List[Path], processing_stats: ProcessingStats, config: Config,
+                            early_results: Optional[Dict[str, Future]] = None) -> None:
+    console.print(_STAGE_2_INTRO_PANEL)
 
+    # The file list comes from stage 1, so the output tree is not walked a second time
     if not separated_files:
         console.print(Panel(
             f"[yellow]Не найдено файлов *.xlsx для преобразования в KML в директории '{config.xlsx_output_dir}' и ее подпапках.[/yellow]",
@@ -118,12 +186,90 @@ def _process_kml_conversion(processing_stats: ProcessingStats, config: Config) -
     logger.info(f"Создана базовая папка для KML: {config.kml_output_dir}")
 
     conversion_errors = _run_parallel_conversion(
-        separated_files, processing_stats, config)
+        separated_files, processing_stats, config, early_results)
     _report_conversion_results(separated_files, conversion_errors, config)
 
 
-def _run_parallel_conversion(separated_files: List[Path], processing_stats: ProcessingStats, config: Config) -> int:
+def _run_parallel_conversion(separated_files: List[Path], processing_stats: ProcessingStats, config: Config,
+                             early_results: Optional[Dict[str, Future]] = None) -> int:
+    worker_args = _prepare_worker_args(
+        separated_files, config, config.kml_output_dir)
+    return _run_conversion_tasks(
+        worker_args, process_file_worker_unpack, "Преобразование в KML...",
+        processing_stats, config, early_results)
+
+
+# Tasks queued per worker: enough to keep every worker busy without holding all files' futures at once
+_INFLIGHT_TASKS_PER_WORKER = 4
+
+
+def _windowed_submit(executor: Executor,
+                     worker: Callable[[Dict[str, Any]], Tuple[bool, str, Optional[ConversionResult], Optional[str]]],
+                     worker_args: Sequence[Dict[str, Any]],
+                     window: int) -> Iterator[Tuple[Dict[str, Any], Callable[[], Any]]]:
+    """Submits ``worker`` over ``worker_args`` keeping at most ``window`` tasks in flight.
+
+    Yields ``(args, future.result)`` pairs in completion order; a finished task frees its
+    slot for the next file. Closing the generator (e.g. on Ctrl-C) cancels the queued tasks.
+    """
+    # Futures report themselves as they finish, instead of every in-flight future
+    # being re-scanned by wait() after each completion
+    completed: "queue.SimpleQueue[Future]" = queue.SimpleQueue()
+    inflight: Dict[Future, Dict[str, Any]] = {}
+
+    def submit(args: Dict[str, Any]) -> None:
+        future = executor.submit(worker, args)
+        inflight[future] = args
+        future.add_done_callback(completed.put)
+
+    remaining = iter(worker_args)
+    for args in islice(remaining, window):
+        submit(args)
+    try:
+        while inflight:
+            future = completed.get()
+            args = inflight.pop(future)
+            next_args = next(remaining, None)
+            if next_args is not None:
+                submit(next_args)
+            yield args, future.result
+    finally:
+        for future in inflight:
+            future.cancel()
+
+
+def _run_conversion_tasks(worker_args: List[Dict[str, Any]],
+                          worker: Callable[[Dict[str, Any]], Tuple[bool, str, Optional[ConversionResult], Optional[str]]],
+                          description: str, processing_stats: ProcessingStats, config: Config,
+                          early_results: Optional[Dict[str, Future]] = None,
+                          use_manifest: bool = False) -> int:
+    """Runs ``worker`` over ``worker_args`` (in the pool or inline) and records the results.
+
+    ``use_manifest`` enables the conversion manifest (see Config.conversion_manifest_path);
+    it only pays off for XLSX files that are not rewritten before every run.
+    Returns the number of failed files.
+    """
     conversion_errors = 0
+    # Per-file console output serialises on rich's render lock; the progress bar already
+    # shows completed files, so only the failures are listed, once, after the run
+    failed_files: List[str] = []
+
+    # Files already submitted during separation are collected first; only the rest is dispatched now
+    early_results = early_results or {}
+    early_args = [args for args in worker_args if args['xlsx_file_path'] in early_results]
+    pending_args = [args for args in worker_args if args['xlsx_file_path'] not in early_results]
+
+    # Files the manifest lists as converted and unchanged since are not converted again
+    manifest = open_manifest(config) if use_manifest else None
+    if manifest is not None:
+        kml_paths = {args['xlsx_file_path']: args['kml_file_path'] for args in pending_args}
+        unchanged_files = len(pending_args)
+        pending_args = manifest.pending(pending_args)
+        unchanged_files -= len(pending_args)
+        if unchanged_files:
+            console.print(
+                f"[dim]Пропущено файлов без изменений: {unchanged_files}[/dim]")
+    worker_args = early_args + pending_args
 
     with Progress(
         SpinnerColumn(),
@@ -135,86 +281,254 @@ def _run_parallel_conversion(separated_files: List[Path], processing_stats: Proc
         console=console,
         transient=False
     ) as progress:
-        task = progress.add_task(
-            "Преобразование в KML...", total=len(separated_files))
+        task = progress.add_task(description, total=len(worker_args))
 
-        worker_args = _prepare_worker_args(separated_files, config)
-        max_workers = _determine_max_workers(separated_files, config)
+        max_workers = _determine_max_workers(worker_args, config)
 
-        console.print(
-            f"[dim]Запуск параллельной обработки с {max_workers} потоками...[/dim]")
+        if max_workers <= 1 or len(worker_args) <= config.inline_conversion_max_files:
+            # Starting worker processes would cost more than converting a file or two here
+            console.print(
+                f"[dim]Обработка {len(pending_args)} файлов в основном процессе...[/dim]")
+            pending_outcomes = ((args, partial(worker, {**args, 'config': config})) for args in pending_args)
+            # Keep the console as quiet as it is for pool workers
+            console_quiet = console_log_level(logging.ERROR)
+        else:
+            console.print(
+                f"[dim]Запуск параллельной обработки с {max_workers} потоками...[/dim]")
+            executor = _get_executor(max_workers, config)
+            pending_outcomes = _windowed_submit(
+                executor, worker, pending_args, window=max_workers * _INFLIGHT_TASKS_PER_WORKER)
+            # Worker threads log through this process's handlers, so quiet the console as for processes
+            console_quiet = (console_log_level(logging.ERROR)
+                             if config.executor_kind == "thread" else nullcontext())
+        outcomes = chain(
+            ((args, early_results[args['xlsx_file_path']].result) for args in early_args),
+            pending_outcomes)
         console.print(
             f"[dim]DEBUG/WARNING сообщения подавлены в консоли для повышения производительности[/dim]")
 
-        # ensure correct import in subprocess on Windows
-        from src.workers import process_file_worker
+        # Results are only buffered while the progress bar is live; stats are applied afterwards
+        results_buffer: List[Tuple[str, Tuple[bool, str, Optional[ConversionResult], Optional[str]]]] = []
+        handled_paths = set()
+        pool_broken = False
+        try:
+            with console_quiet:
+                for args, get_result in outcomes:
+                    file_path = args['xlsx_file_path']
+                    try:
+                        result = get_result()
+                    except BrokenProcessPool:
+                        raise
+                    except Exception as e:
+                        # Only this file is lost; the other tasks keep running
+                        logger.error(
+                            f"Критическая ошибка при обработке {file_path}: {e}", exc_info=True)
+                        result = (False, Path(file_path).name, None, str(e))
+                    results_buffer.append((file_path, result))
+                    handled_paths.add(file_path)
+                    progress.advance(task)
+        except Exception as e:
+            # A dead worker process breaks the whole pool: nothing still queued will finish
+            pool_broken = isinstance(e, BrokenProcessPool)
+            lost_args = [args for args in worker_args if args['xlsx_file_path'] not in handled_paths]
+            failed_files.extend(Path(args['xlsx_file_path']).name for args in lost_args)
+            conversion_errors += len(lost_args)
+            processing_stats.conversion_errors += len(lost_args)
+            logger.error(f"Критическая ошибка при обработке файлов: {e}", exc_info=True)
+            progress.advance(task, len(lost_args))
+        finally:
+            # A pool whose worker died cannot take new tasks; the next run builds a fresh one
+            if pool_broken:
+                _shutdown_executor()
+
+    for file_path, (success, processed_filename, conversion_result, error_message) in results_buffer:
+        if success:
+            if conversion_result is not None:
+                processing_stats.add_file_result(conversion_result)
+                if conversion_result.anomaly_file_created:
+                    processing_stats.anomaly_files_generated += 1
+        else:
+            failed_files.append(processed_filename)
+            conversion_errors += 1
+            processing_stats.conversion_errors += 1
+            logger.error(
+                f"Ошибка при конвертации {file_path} в KML: {error_message}")
+
+    if manifest is not None:
+        manifest.record(kml_paths[file_path] for file_path, (success, _, _, _) in results_buffer
+                        if success and file_path in kml_paths)
+        manifest.close()
+
+    if failed_files:
+        console.print(
+            f"[dim]Ошибки конвертации ({len(failed_files)}): [red]{', '.join(failed_files)}[/red][/dim]")
+    return conversion_errors
 
-        with ProcessPoolExecutor(
-            max_workers=max_workers,
-            initializer=initialize_worker_logging
-        ) as executor:
-            future_to_file = {
-                executor.submit(process_file_worker, **args): args['xlsx_file_path']
-                for args in worker_args
-            }
 
-            for future in as_completed(future_to_file):
-                file_path = future_to_file[future]
-                filename = Path(file_path).name
+# Persistent worker pool: spawning processes and warming their transformer caches
+# is paid once per session instead of on every conversion run.
+_executor: Optional[Executor] = None
+_executor_key: Optional[Tuple[int, Config]] = None
+# Writes the process workers' log records (sent over a queue) to this process's log files
+_log_listener: Optional[logging.handlers.QueueListener] = None
 
-                try:
-                    success, processed_filename, conversion_result, error_message = future.result()
-
-                    if success:
-                        console.print(
-                            f"[dim]Завершено: [green]{processed_filename}[/green][/dim]")
-                        if conversion_result is not None:
-                            processing_stats.add_file_result(conversion_result)
-                            if conversion_result.anomaly_file_created:
-                                processing_stats.anomaly_files_generated += 1
-                    else:
-                        console.print(
-                            f"[dim]Ошибка: [red]{processed_filename}[/red][/dim]")
-                        conversion_errors += 1
-                        processing_stats.conversion_errors += 1
-                        logger.error(
-                            f"Ошибка при конвертации {file_path} в KML: {error_message}")
-
-                except Exception as e:
-                    console.print(
-                        f"[dim]Критическая ошибка: [red]{filename}[/red][/dim]")
-                    conversion_errors += 1
-                    processing_stats.conversion_errors += 1
-                    logger.error(
-                        f"Критическая ошибка при обработке {file_path}: {e}", exc_info=True)
-                finally:
-                    progress.advance(task)
 
-    return conversion_errors
+def _get_executor(max_workers: int, config: Config) -> Executor:
+    """Returns the session pool, rebuilding it only if it is too small or set up differently.
 
+    Workers receive the config once through the initializer, so it is part of the pool's identity.
+    A pool broken by a dead worker or a failed initializer is replaced as well.
+    """
+    global _executor, _executor_key, _log_listener
+    if (_executor is None or _executor_key is None
+            or getattr(_executor, "_broken", False)
+            or _executor_key[0] < max_workers
+            or _executor_key[1] != config):
+        _shutdown_executor()
+        if config.executor_kind == "thread":
+            # Threads share this process's transformer cache and need no pickling
+            _executor = ThreadPoolExecutor(
+                max_workers=max_workers,
+                initializer=initialize_worker,
+                initargs=(config,)
+            )
+        else:
+            pool_kwargs: Dict[str, Any] = {}
+            if config.max_tasks_per_worker is not None and sys.version_info >= (3, 11):
+                # Recycled workers release openpyxl/lxml memory; 'fork' cannot be used then
+                pool_kwargs['max_tasks_per_child'] = config.max_tasks_per_worker
+            # The log queue must come from the same start method as the workers
+            mp_context = _process_pool_context(
+                recycles_workers='max_tasks_per_child' in pool_kwargs)
+            log_queue = mp_context.Queue()
+            _log_listener = start_worker_log_listener(log_queue)
+            _executor = ProcessPoolExecutor(
+                max_workers=max_workers,
+                mp_context=mp_context,
+                initializer=initialize_worker,
+                initargs=(config, log_queue),
+                **pool_kwargs
+            )
+        _executor_key = (max_workers, config)
+    return _executor
 
-def _prepare_worker_args(separated_files: List[Path], config: Config) -> List[Dict[str, Any]]:
-    worker_args: List[Dict[str, Any]] = []
-    for xlsx_file_path in separated_files:
-        relative_path = xlsx_file_path.relative_to(
-            Path(config.xlsx_output_dir))
-        kml_file_rel_path = relative_path.with_suffix('.kml')
-        kml_file_abs_path = Path(config.kml_output_dir) / kml_file_rel_path
-
-        worker_args.append({
-            'xlsx_file_path': str(xlsx_file_path),
-            'kml_file_path': str(kml_file_abs_path),
-            'xlsx_output_dir': config.xlsx_output_dir,
-            'kml_output_dir': config.kml_output_dir
-        })
+
+def _process_pool_context(recycles_workers: bool) -> multiprocessing.context.BaseContext:
+    """Picks the start method that re-imports the least in each new worker.
+
+    The platform default ('fork' on Linux) shares the parent's imports, but a pool
+    that recycles workers may not fork. There a fork server that has already
+    imported the worker module (openpyxl, pyproj) is used where available, and
+    'spawn' elsewhere.
+    """
+    if not recycles_workers:
+        return multiprocessing.get_context()
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context("forkserver")
+        context.set_forkserver_preload(["src.workers"])
+        return context
+    return multiprocessing.get_context("spawn")
+
+
+def _shutdown_executor() -> None:
+    global _executor, _executor_key, _log_listener
+    if _executor is not None:
+        _executor.shutdown(wait=True, cancel_futures=True)
+    # Stopped after the workers, so their last records are still written
+    if _log_listener is not None:
+        _log_listener.stop()
+    _executor = None
+    _executor_key = None
+    _log_listener = None
+
+
+atexit.register(_shutdown_executor)
+
+
+def _prepare_worker_args(separated_files: List[Path], config: Config, kml_output_dir: str) -> List[Dict[str, Any]]:
+    # Largest files first (LPT scheduling): a big region is not left to run alone at the
+    # end while the other workers sit idle, and the small files fill in the tail
+    sizes = {path: _file_size(path) for path in separated_files}
+    ordered_files = sorted(separated_files, key=sizes.__getitem__, reverse=True)
+
+    xlsx_root, kml_root = _output_roots(config.xlsx_output_dir, kml_output_dir)
+    worker_args = [_worker_args_for(str(xlsx_file_path), xlsx_root, kml_root)
+                   for xlsx_file_path in ordered_files]
+
+    # Output directories are created once here rather than by every worker task
+    for kml_dir in {os.path.dirname(args['kml_file_path']) for args in worker_args}:
+        os.makedirs(kml_dir, exist_ok=True)
     return worker_args
 
 
-def _determine_max_workers(separated_files: List[Path], config: Config) -> int:
-    if config.max_parallel_workers is not None:
-        return min(len(separated_files), config.max_parallel_workers)
+def _output_roots(xlsx_output_dir: str, kml_output_dir: str) -> Tuple[str, str]:
+    # Normalised the same way as str(Path(...)) of the walked files, so plain prefix checks work
+    return str(Path(xlsx_output_dir)), str(Path(kml_output_dir))
+
+
+def _worker_args_for(xlsx_file_path: str, xlsx_root: str, kml_root: str) -> Dict[str, Any]:
+    # String operations only: no PurePath objects are built per file
+    if xlsx_file_path.startswith(xlsx_root + os.sep):
+        relative_path = xlsx_file_path[len(xlsx_root) + 1:]
     else:
-        return min(len(separated_files), multiprocessing.cpu_count())
+        relative_path = os.path.relpath(xlsx_file_path, xlsx_root)
+    kml_file_path = os.path.join(
+        kml_root, os.path.splitext(relative_path)[0] + '.kml')
+
+    # Only the per-file paths travel with each task; the config reaches workers via the initializer
+    return {
+        'xlsx_file_path': xlsx_file_path,
+        'kml_file_path': kml_file_path,
+    }
+
+
+def _make_early_submitter(early_results: Dict[str, Future], config: Config) -> Optional[Callable[[Path], None]]:
+    """Returns a callback that submits each separated file to the worker pool right away.
+
+    Futures are stored in ``early_results`` by XLSX path. Returns None when the
+    conversion would not use a pool anyway.
+    """
+    max_workers = _configured_max_workers(config)
+    if max_workers <= 1:
+        return None
+    executor = _get_executor(max_workers, config)
+    xlsx_root, kml_root = _output_roots(
+        config.xlsx_output_dir, config.kml_output_dir)
+    created_dirs = set()
+
+    def submit(xlsx_file_path: Path) -> None:
+        args = _worker_args_for(str(xlsx_file_path), xlsx_root, kml_root)
+        kml_dir = os.path.dirname(args['kml_file_path'])
+        if kml_dir not in created_dirs:
+            os.makedirs(kml_dir, exist_ok=True)
+            created_dirs.add(kml_dir)
+        early_results[args['xlsx_file_path']] = executor.submit(
+            process_file_worker_unpack, args)
+
+    return submit
+
+
+def _file_size(path: Path) -> int:
+    try:
+        return path.stat().st_size
+    except OSError:
+        return 0
+
+
+# Upper bound for the automatic worker count: XLSX parsing stops scaling well
+# beyond this, and every extra process costs memory
+_AUTO_MAX_WORKERS = 8
+
+
+def _determine_max_workers(files: Sequence[Any], config: Config) -> int:
+    return min(len(files), _configured_max_workers(config))
+
+
+def _configured_max_workers(config: Config) -> int:
+    if config.max_parallel_workers is not None:
+        return config.max_parallel_workers
+    # ~80% of logical CPUs leaves headroom for the main process and the OS
+    return max(1, min(multiprocessing.cpu_count() * 4 // 5, _AUTO_MAX_WORKERS))
 
 
 def _report_conversion_results(separated_files: List[Path], conversion_errors: int, config: Config) -> None:
@@ -250,13 +564,7 @@ def _report_conversion_results(separated_files: List[Path], conversion_errors: i
 
 
 def process_mode_2_single_file(config: Config) -> None:
-    console.print(Panel(
-        "[bold cyan]Режим: Преобразование одного файла .xlsx в .kml[/bold cyan]\n\n"
-        "[dim]Быстрое преобразование одного файла Excel в формат KML\n"
-        "без разделения по регионам.[/dim]",
-        title="🚀 Быстрое преобразование",
-        border_style="cyan"
-    ))
+    console.print(_MODE_2_INTRO_PANEL)
 
     file_name = choose_file(config)
     if not file_name:
@@ -267,8 +575,6 @@ def process_mode_2_single_file(config: Config) -> None:
     output_filename = Path(config.single_kml_output_dir) / \
         f"{input_path.stem}.kml"
 
-    from rich.table import Table
-
     info_table = Table(show_header=False, box=None)
     info_table.add_column("Параметр", style="bold", width=20)
     info_table.add_column("Значение", style="green")
@@ -278,29 +584,25 @@ def process_mode_2_single_file(config: Config) -> None:
     console.print(
         Panel(info_table, title="ℹ️ Параметры преобразования", border_style="blue"))
 
-    from openpyxl import load_workbook
-    from src.xlsx_to_kml import create_kml_from_coordinates, get_transformers
-    from src.stats import ProcessingStats, display_processing_statistics
-
     try:
         single_stats = ProcessingStats()
         single_stats.regions_detected = 1
 
         with console.status("[cyan]Преобразование файла в KML...[/cyan]", spinner="dots"):
-            workbook = load_workbook(filename=str(input_path), data_only=True)
-            # Load transformers lazily (cached in current process)
-            transformers = None
-            try:
-                transformers = get_transformers()
-            except Exception:
-                transformers = None
-            conversion_result = create_kml_from_coordinates(
-                workbook.active,
-                output_file=str(output_filename),
-                filename=input_path.name,
-                transformers=transformers,
-                config=config
-            )
+            # Streaming read: the sheet is only scanned row by row (values only)
+            with open(input_path, 'rb', buffering=XLSX_READ_BUFFER_SIZE) as xlsx_file:
+                workbook = load_workbook(
+                    filename=xlsx_file, read_only=True, data_only=True, keep_links=False)
+                try:
+                    conversion_result = create_kml_from_coordinates(
+                        workbook.active,
+                        output_file=str(output_filename),
+                        filename=input_path.name,
+                        transformers=cached_transformers(config.proj4_path),
+                        config=config
+                    )
+                finally:
+                    workbook.close()
 
             single_stats.add_file_result(conversion_result)
             if conversion_result.anomaly_file_created:
@@ -386,13 +688,7 @@ def _log_processing_summary(stats: ProcessingStats) -> None:
 
 def process_mode_3_demo_maps(config: Config) -> None:
     """Process demo maps mode - create demo KML files with a percentage of objects."""
-    console.print(Panel(
-        "[bold cyan]Режим: Создание демо-карт[/bold cyan]\n\n"
-        "[dim]Создание демо-версий KML карт с ограниченным количеством объектов\n"
-        "из разделенных файлов xlsx.[/dim]",
-        title="🎨 Создание демо-карт",
-        border_style="cyan"
-    ))
+    console.print(_MODE_3_INTRO_PANEL)
 
     # Get demo percentage
     demo_percentage = choose_demo_percentage()
@@ -417,9 +713,7 @@ def process_mode_3_demo_maps(config: Config) -> None:
 def _process_all_demo_files(demo_percentage: float, processing_stats: ProcessingStats, config: Config) -> None:
     """Process all xlsx files in the output directory for demo conversion."""
     xlsx_dir = Path(config.xlsx_output_dir)
-    xlsx_files = list(xlsx_dir.rglob('*.xlsx'))
-    # Filter out temp files
-    xlsx_files = [f for f in xlsx_files if not f.name.startswith('~$')]
+    xlsx_files = [Path(p) for p in find_xlsx_files(config.xlsx_output_dir)]
 
     if not xlsx_files:
         console.print(Panel(
@@ -437,58 +731,17 @@ def _process_all_demo_files(demo_percentage: float, processing_stats: Processing
     logger.info(f"Создана папка для демо KML: {config.demo_kml_output_dir}")
 
     processing_stats.regions_detected = len(xlsx_files)
-    conversion_errors = 0
 
-    with Progress(
-        SpinnerColumn(),
-        TextColumn("[progress.description]{task.description}"),
-        BarColumn(),
-        TextColumn("[progress.percentage]{task.percentage:>3.0f}%"),
-        TextColumn("({task.completed}/{task.total} файлов)"),
-        TimeRemainingColumn(),
-        console=console,
-        transient=False
-    ) as progress:
-        task = progress.add_task(
-            f"Создание демо-карт ({demo_percentage}%)...", total=len(xlsx_files))
-
-        for xlsx_file_path in xlsx_files:
-            try:
-                # Create output path preserving directory structure
-                relative_path = xlsx_file_path.relative_to(xlsx_dir)
-                demo_kml_rel_path = relative_path.with_suffix('.kml')
-                demo_kml_abs_path = Path(
-                    config.demo_kml_output_dir) / demo_kml_rel_path
-
-                # Create parent directories if needed
-                demo_kml_abs_path.parent.mkdir(parents=True, exist_ok=True)
-
-                success, conversion_result = _convert_single_file_to_demo_kml(
-                    str(xlsx_file_path), str(
-                        demo_kml_abs_path), demo_percentage, config
-                )
-
-                if success and conversion_result:
-                    processing_stats.add_file_result(conversion_result)
-                    if conversion_result.anomaly_file_created:
-                        processing_stats.anomaly_files_generated += 1
-                    console.print(
-                        f"[dim]Готово: [green]{xlsx_file_path.name}[/green][/dim]")
-                else:
-                    conversion_errors += 1
-                    processing_stats.conversion_errors += 1
-                    console.print(
-                        f"[dim]Ошибка: [red]{xlsx_file_path.name}[/red][/dim]")
-
-            except Exception as e:
-                conversion_errors += 1
-                processing_stats.conversion_errors += 1
-                logger.error(
-                    f"Ошибка при создании демо-карты для {xlsx_file_path}: {e}", exc_info=True)
-                console.print(
-                    f"[dim]Критическая ошибка: [red]{xlsx_file_path.name}[/red][/dim]")
-            finally:
-                progress.advance(task)
+    # Demo maps go through the same worker pool as mode 1. The XLSX files already
+    # exist, so unchanged ones can be skipped via the manifest
+    worker_args = _prepare_worker_args(
+        xlsx_files, config, config.demo_kml_output_dir)
+    for args in worker_args:
+        args['demo_percentage'] = demo_percentage
+    conversion_errors = _run_conversion_tasks(
+        worker_args, process_demo_file_worker_unpack,
+        f"Создание демо-карт ({demo_percentage}%)...", processing_stats, config,
+        use_manifest=True)
 
     _report_demo_conversion_results(
         len(xlsx_files), conversion_errors, demo_percentage, config)
@@ -557,43 +810,11 @@ def _process_single_demo_file(file_path: str, demo_percentage: float, processing
 
 def _convert_single_file_to_demo_kml(xlsx_path: str, kml_path: str, demo_percentage: float, config: Config) -> Tuple[bool, Optional[ConversionResult]]:
     """Convert a single xlsx file to demo KML with specified percentage of objects."""
-    try:
-        from openpyxl import load_workbook
-        from src.xlsx_to_kml import create_kml_from_coordinates, get_transformers
-
-        workbook = load_workbook(filename=xlsx_path, data_only=True)
-
-        # Load transformers
-        transformers = None
-        try:
-            transformers = get_transformers()
-        except Exception:
-            transformers = None
-
-        conversion_result = create_kml_from_coordinates(
-            workbook.active,
-            output_file=kml_path,
-            filename=Path(xlsx_path).name,
-            transformers=transformers,
-            config=config,
-            demo_percentage=demo_percentage
-        )
-
-        # Check if demo file is empty
-        if conversion_result.successful_rows == 0:
-            logger.warning(
-                f"Demo file would be empty for {xlsx_path}, skipping")
-            # Remove empty file if it was created
-            if Path(kml_path).exists():
-                Path(kml_path).unlink()
-            return False, None
-
-        return True, conversion_result
-
-    except Exception as e:
-        logger.error(
-            f"Error converting {xlsx_path} to demo KML: {e}", exc_info=True)
-        return False, None
+    success, _, conversion_result, error_message = process_demo_file_worker(
+        xlsx_path, kml_path, demo_percentage, config)
+    if not success:
+        logger.warning(f"Demo KML not created for {xlsx_path}: {error_message}")
+    return success, conversion_result
 
 
 def _report_demo_conversion_results(total_files: int, conversion_errors: int, demo_percentage: float, config: Config) -> None:
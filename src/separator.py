@@ -1,19 +1,75 @@
+import datetime
 import openpyxl
+import posixpath
 import re
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, Executor, ThreadPoolExecutor, wait
+from dataclasses import dataclass, replace
+from io import BytesIO
+from itertools import islice
+from math import isfinite
 from pathlib import Path
+from typing import Callable, Dict, Optional, Tuple
+from xml.etree.ElementTree import fromstring, iterparse
+from xml.sax.saxutils import escape
 from openpyxl.utils import get_column_letter  # type: ignore[attr-defined]
 from openpyxl.styles import Font
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.cell.cell import ERROR_CODES, ILLEGAL_CHARACTERS_RE
+from openpyxl.utils.datetime import to_excel
+from openpyxl.worksheet.cell_range import CellRange, MultiCellRange
+from openpyxl.xml.constants import ARC_ROOT_RELS, REL_NS, SHEET_MAIN_NS
 import logging  # Импортируем модуль логирования
 import time
 
+from src.utils import XLSX_READ_BUFFER_SIZE
+
 
 # --- Configuration ---
 INPUT_FILE = './input/BigTable (Trimmed).xlsx'
 OUTPUT_DIR = 'output/xlsx'
 HEADER_ROW_COUNT = 5
 FULL_WIDTH_MERGE_COLUMNS = (1, 7)  # Столбцы A-G
+INSTRUCTION_TEXT = "Инструкция по использованию KML"
+INSTRUCTION_URL = "https://www.rudi.ru/kml-instruction.php"
 # --- End Configuration ---
 
+# Стиль гиперссылки создаётся один раз и переиспользуется
+HYPERLINK_FONT = Font(color="0000FF", underline="single")
+
+# Ключевые слова строк-разделителей: один поиск по регулярному выражению вместо
+# проверки каждого слова. БВУ проверяется первым, поэтому шаблоны раздельные.
+BKU_PATTERN = re.compile(r'бву|комитет|департамент')
+REGION_PATTERN = re.compile(
+    r'область|край|автономная|республика|округ|севастополь|москва|санкт-петербург')
+
+# Имена файлов: недопустимые символы заменяются на '_' одной таблицей, а не регулярным выражением
+_FILENAME_BAD_CHARS = str.maketrans({char: '_' for char in '<>:"/\\|?*'})
+_WHITESPACE_RE = re.compile(r'\s+')
+_UNDERSCORES_RE = re.compile(r'_+')
+
+# Сколько файлов регионов может ожидать записи одновременно: ограничивает
+# память, занятую данными регионов, пока чтение опережает запись
+MAX_PENDING_WRITES = 4
+
+# Регионы короче этого числа строк пишутся в готовый пакет без openpyxl (см. write_region_package)
+SMALL_REGION_ROWS = 500
+_SHEET_PART = "xl/worksheets/sheet1.xml"
+# Значения дат и времени, по которым openpyxl выбирает формат ячейки
+_DATE_SAMPLES = (
+    (datetime.datetime, datetime.datetime(2000, 1, 1)),
+    (datetime.date, datetime.date(2000, 1, 1)),
+    (datetime.time, datetime.time()),
+)
+
+# Элементы XML книги и листа, нужные read_sheet_layout
+_OFFICE_DOCUMENT_REL = f"{REL_NS}/officeDocument"
+_SHEET_TAG = f"{{{SHEET_MAIN_NS}}}sheet"
+_REL_ID_ATTR = f"{{{REL_NS}}}id"
+_ROW_TAG = f"{{{SHEET_MAIN_NS}}}row"
+_COL_TAG = f"{{{SHEET_MAIN_NS}}}col"
+_MERGE_CELL_TAG = f"{{{SHEET_MAIN_NS}}}mergeCell"
+
 
 # --- Setup Logging using the utility function ---
 # Get logger for this module (configuration will be handled by main.py)
@@ -25,14 +81,9 @@ logger = logging.getLogger(__name__)
 
 def sanitize_filename(name):
     """Удаляет недопустимые символы из имени файла/папки."""
-    name = str(name).strip()
-    name = re.sub(r'[<>:"/\\|?*]', '_', name)
-    name = re.sub(r'\s+', ' ', name)
-    name = name.strip('_')
-    name = re.sub(r'_+', '_', name)
-    if not name:
-        name = "unnamed"
-    return name
+    name = str(name).strip().translate(_FILENAME_BAD_CHARS)
+    name = _WHITESPACE_RE.sub(' ', name).strip('_')
+    return _UNDERSCORES_RE.sub('_', name) or "unnamed"
 
 
 def copy_column_widths(source_sheet, target_sheet):
@@ -76,60 +127,138 @@ def get_full_row_text(row_values):
     """Объединяет непустые значения ячеек строки в одну строку."""
     return " ".join(filter(None, map(str, row_values))).strip()
 
+def _sheet_part_path(archive, sheet_title):
+    """Путь XML листа sheet_title внутри архива: через _rels/.rels, workbook.xml и его связи."""
+    root_rels = fromstring(archive.read(ARC_ROOT_RELS))
+    workbook_path = next(rel.get('Target') for rel in root_rels
+                         if rel.get('Type') == _OFFICE_DOCUMENT_REL).lstrip('/')
+    workbook_dir, workbook_name = posixpath.split(workbook_path)
+    rel_id = next(sheet.get(_REL_ID_ATTR)
+                  for sheet in fromstring(archive.read(workbook_path)).iter(_SHEET_TAG)
+                  if sheet.get('name') == sheet_title)
+    workbook_rels = fromstring(archive.read(
+        posixpath.join(workbook_dir, '_rels', f"{workbook_name}.rels")))
+    target = next(rel.get('Target') for rel in workbook_rels if rel.get('Id') == rel_id)
+    if target.startswith('/'):
+        return target[1:]
+    return posixpath.normpath(posixpath.join(workbook_dir, target))
+
+
+def read_sheet_layout(input_path, sheet_title):
+    """
+    Возвращает объединённые диапазоны (CellRange) и ширины столбцов листа —
+    кортежи (первый столбец, последний столбец, ширина), как в элементах <col>.
+    В режиме read-only openpyxl их не загружает, поэтому они читаются прямо из XML
+    листа: разбор без создания ячеек намного дешевле полной загрузки книги.
+    Если XML листа прочитать не удалось, слияния и ширины не переносятся.
+    """
+    merged_ranges = []
+    col_widths = []
+    try:
+        with zipfile.ZipFile(input_path) as archive:
+            with archive.open(_sheet_part_path(archive, sheet_title)) as source:
+                for _, element in iterparse(source):
+                    tag = element.tag
+                    if tag == _ROW_TAG:
+                        # Ячейки строки больше не нужны
+                        element.clear()
+                    elif tag == _COL_TAG:
+                        # Ширина по умолчанию — как у ColumnDimension в openpyxl
+                        width = float(element.get('width', 13))
+                        if width:
+                            min_col = int(element.get('min'))
+                            max_col = int(element.get('max', min_col))
+                            col_widths.append((min_col, max_col, width))
+                    elif tag == _MERGE_CELL_TAG:
+                        merged_ranges.append(CellRange(element.get('ref')))
+    except Exception as e:
+        logging.warning(
+            "Не удалось прочитать слияния и ширины столбцов листа '%s': %s", sheet_title, e)
+        return [], []
+    return merged_ranges, col_widths
+
 # --- Основная логика обработки ---
 
 
-def split_excel_file_by_merges(input_path, output_base_dir, header_rows_count, merge_cols):
+def split_excel_file_by_merges(input_path, output_base_dir, header_rows_count, merge_cols,
+                               on_file_written: Optional[Callable[[Path], None]] = None,
+                               write_executor: Optional[Executor] = None,
+                               max_pending_writes: int = MAX_PENDING_WRITES):
     """
     Разделяет файл Excel, используя строки, объединенные на всю ширину, как основные разделители.
-    Оптимизировано: метаданные читаются в обычном режиме, данные — в стриминговом (values_only).
+    Оптимизировано: книга открывается один раз в режиме read-only; слияния и ширины столбцов
+    берутся из XML листа (см. read_sheet_layout), шапка и данные — за один потоковый проход (values_only).
+
+    on_file_written, если задан, вызывается с путём каждого файла региона сразу
+    после его сохранения — так следующий этап может начать работу, не дожидаясь
+    окончания разделения.
+
+    Файлы регионов сохраняются параллельно с чтением исходного файла: через
+    write_executor, если он задан, иначе в отдельном потоке записи. Одновременно
+    ожидают записи не более max_pending_writes регионов; on_file_written
+    вызывается по мере готовности файлов.
     """
     total_start_time = time.time()
     logging.info("--- Запуск процесса разделения файла ---")
 
     # --- 1. Чтение метаданных: слияния, ширины, шапка ---
-    meta_wb = openpyxl.load_workbook(
-        input_path, data_only=True, read_only=False)
-    meta_ws = meta_wb.active
+    # Книга открывается один раз в режиме read-only: полная загрузка создала бы объект
+    # для каждой ячейки листа. Поток листа читается мелкими порциями; буфер 1 МБ
+    # сокращает число системных вызовов.
+    with open(input_path, 'rb', buffering=XLSX_READ_BUFFER_SIZE) as source_file:
+        wb = openpyxl.load_workbook(
+            source_file, data_only=True, read_only=True)
+        # Без внешнего пула запись идёт в одном фоновом потоке: сжатие выходных файлов
+        # перекрывается с распаковкой и разбором исходного
+        own_writer = None
+        if write_executor is None:
+            own_writer = ThreadPoolExecutor(
+                max_workers=1, thread_name_prefix="region-writer")
+        try:
+            files_saved_count = _split_sheet(
+                input_path, wb, output_base_dir, header_rows_count, merge_cols, on_file_written,
+                write_executor or own_writer, max_pending_writes)
+        finally:
+            # При ошибке книга и поток записи не должны остаться открытыми до конца сеанса
+            if own_writer is not None:
+                own_writer.shutdown(cancel_futures=True)
+            wb.close()
 
-    # Все объединённые диапазоны
-    all_merged_ranges = list(meta_ws.merged_cells.ranges)
+    logging.info(
+        "Завершено. Файлов сохранено: %d. Всего времени: %.2f сек",
+        files_saved_count, time.time() - total_start_time
+    )
 
-    # Вычисляем строки «полной ширины» (колонны merge_cols)
-    min_col_target, max_col_target = merge_cols
-    full_width_merged_rows = {}
-    for mr in all_merged_ranges:
-        if (mr.min_row == mr.max_row
-                and mr.min_col == min_col_target
-                and mr.max_col == max_col_target):
-            val = meta_ws.cell(row=mr.min_row, column=mr.min_col).value
-            full_width_merged_rows[mr.min_row] = str(
-                val).strip() if val is not None else ""
 
-    # Читаем заголовок (значения)
+def _split_sheet(input_path, wb, output_base_dir, header_rows_count, merge_cols, on_file_written,
+                 writer: Executor, max_pending_writes):
+    """
+    Разделяет активный лист открытой книги (см. split_excel_file_by_merges),
+    отправляя файлы регионов в writer. Возвращает число сохранённых файлов.
+    """
+    ws = wb.active
+    all_merged_ranges, source_col_widths = read_sheet_layout(input_path, ws.title)
+
+    # Один проход по листу: сначала строки шапки, затем (в разделе 2) строки данных
+    rows = enumerate(ws.iter_rows(min_row=1, values_only=True), start=1)
     header_rows_data = [
-        list(row_values)
-        for row_values in meta_ws.iter_rows(
-            min_row=1, max_row=header_rows_count,
-            values_only=True
-        )
-    ]
+        list(row_values) for _, row_values in islice(rows, header_rows_count)]
+
+    # Вычисляем строки «полной ширины» (колонны merge_cols); их текст берётся при чтении данных
+    min_col_target, max_col_target = merge_cols
+    full_width_merged_rows = {
+        mr.min_row for mr in all_merged_ranges
+        if (mr.min_row == mr.max_row
+            and mr.min_col == min_col_target
+            and mr.max_col == max_col_target)
+    }
 
     # --- Вставка инструкции ---
-    instruction_display = "Инструкция по использованию KML"
-    instruction_url = "https://www.rudi.ru/kml-instruction.php"
     num_cols = len(header_rows_data[0]) if header_rows_data else merge_cols[1]
-    instruction_row = [instruction_display] + [None] * (num_cols - 1)
+    instruction_row = [INSTRUCTION_TEXT] + [None] * (num_cols - 1)
     # Вставляем инструкцию как 3-ю строку (индекс 2)
     header_rows_data.insert(2, instruction_row)  # type: ignore[arg-type]
 
-    # Ширины столбцов
-    source_col_widths = {
-        openpyxl.utils.column_index_from_string(col_letter): dim.width
-        for col_letter, dim in meta_ws.column_dimensions.items()
-        if dim.width
-    }
-
     # --- Корректировка слияний в шапке ---
     header_merged_ranges = []
     # 1. Добавляем новое слияние для строки с инструкцией (строка 3)
@@ -152,13 +281,36 @@ def split_excel_file_by_merges(input_path, output_base_dir, header_rows_count, m
             new_coord = f"{get_column_letter(rng.min_col)}{new_min_row}:{get_column_letter(rng.max_col)}{new_max_row}"
             header_merged_ranges.append(new_coord)
 
-    meta_wb.close()
+    # Шапка одинакова для всех регионов — собираем её один раз
+    header_template = build_header_template(
+        header_rows_data, source_col_widths, header_merged_ranges)
 
-    # --- 2. Потоковое чтение данных (стриминг) ---
-    data_wb = openpyxl.load_workbook(
-        input_path, data_only=True, read_only=True)
-    ws = data_wb.active
+    # Регионы, отправленные на запись, в порядке отправки
+    pending_writes = []
+
+    def file_written(saved_path):
+        if saved_path is not None and on_file_written is not None:
+            on_file_written(saved_path)
 
+    def collect_written(wait_all=False):
+        # on_file_written вызывается из читающего потока, а не из потока записи
+        nonlocal pending_writes
+        still_pending = []
+        for future in pending_writes:
+            if wait_all or future.done():
+                file_written(future.result())
+            else:
+                still_pending.append(future)
+        pending_writes = still_pending
+
+    def save_region(region_data, bvu_folder_path, region_name):
+        pending_writes.append(writer.submit(
+            save_region_file_optimized, header_template, region_data, bvu_folder_path, region_name))
+        if len(pending_writes) >= max_pending_writes:
+            wait(pending_writes, return_when=FIRST_COMPLETED)
+        collect_written()
+
+    # --- 2. Потоковое чтение данных (стриминг) ---
     output_path = Path(output_base_dir)
     output_path.mkdir(parents=True, exist_ok=True)
     logging.info("Выходная папка: %s", output_path)
@@ -169,34 +321,20 @@ def split_excel_file_by_merges(input_path, output_base_dir, header_rows_count, m
     current_region_data = []
     current_bvu_folder_path = None
 
-    processed_rows_count = 0
     files_saved_count = 0
     data_rows_collected = 0
 
-    # Предварительно подготовим множества ключевых слов
-    BKU_WORDS = {'бву', 'комитет', 'департамент'}
-    REGION_WORDS = {'область', 'край', 'автономная', 'республика',
-                    'округ', 'севастополь', 'москва', 'санкт-петербург'}
-
     logging.info("Обработка строк начиная с %d...", header_rows_count + 1)
     iter_start = time.time()
+    # Номер строки, на которой выводится следующий лог прогресса (каждые 2000 строк)
+    next_progress_row = header_rows_count + 2000
 
-    for row_idx, row_values in enumerate(
-        ws.iter_rows(
-            min_row=header_rows_count + 1,
-            values_only=True
-        ),
-        start=header_rows_count + 1
-    ):
-        processed_rows_count += 1
-
-        # Преобразуем tuple → список (для удобства последующей записи)
-        # (если вы не модифицируете row_values, можно оставить tuple)
-        row_list = list(row_values)
-
+    for row_idx, row_values in rows:
         if row_idx in full_width_merged_rows:
-            # Это «заголовочная» строка полной ширины
-            merged_text = full_width_merged_rows[row_idx]
+            # Это «заголовочная» строка полной ширины; текст — в первой ячейке слияния
+            merged_value = (row_values[min_col_target - 1]
+                            if len(row_values) >= min_col_target else None)
+            merged_text = str(merged_value).strip() if merged_value is not None else ""
             mt_low = merged_text.lower()
 
             is_region_end = merged_text.startswith(
@@ -207,11 +345,8 @@ def split_excel_file_by_merges(input_path, output_base_dir, header_rows_count, m
             if is_region_end or is_bvu_end:
                 # Финиш региона (и, возможно, БВУ)
                 if current_bvu_name and current_region_name and current_region_data:
-                    save_region_file_optimized(
-                        header_rows_data, current_region_data,
-                        current_bvu_folder_path, current_region_name,
-                        source_col_widths, header_merged_ranges
-                    )
+                    save_region(current_region_data,
+                                current_bvu_folder_path, current_region_name)
                     files_saved_count += 1
                 current_region_data = []
                 current_region_name = None
@@ -220,14 +355,11 @@ def split_excel_file_by_merges(input_path, output_base_dir, header_rows_count, m
                     current_bvu_name = None
                     current_bvu_folder_path = None
 
-            elif any(w in mt_low for w in BKU_WORDS):
+            elif BKU_PATTERN.search(mt_low):
                 # Новый БВУ
                 if current_bvu_name and current_region_name and current_region_data:
-                    save_region_file_optimized(
-                        header_rows_data, current_region_data,
-                        current_bvu_folder_path, current_region_name,
-                        source_col_widths, header_merged_ranges
-                    )
+                    save_region(current_region_data,
+                                current_bvu_folder_path, current_region_name)
                     files_saved_count += 1
 
                 current_bvu_name = sanitize_filename(merged_text)
@@ -236,14 +368,11 @@ def split_excel_file_by_merges(input_path, output_base_dir, header_rows_count, m
                 current_region_name = None
                 current_region_data = []
 
-            elif any(w in mt_low for w in REGION_WORDS):
+            elif REGION_PATTERN.search(mt_low):
                 # Новый Регион
                 if current_bvu_name and current_region_name and current_region_data:
-                    save_region_file_optimized(
-                        header_rows_data, current_region_data,
-                        current_bvu_folder_path, current_region_name,
-                        source_col_widths, header_merged_ranges
-                    )
+                    save_region(current_region_data,
+                                current_bvu_folder_path, current_region_name)
                     files_saved_count += 1
 
                 current_region_name = sanitize_filename(merged_text)
@@ -259,7 +388,8 @@ def split_excel_file_by_merges(input_path, output_base_dir, header_rows_count, m
         else:
             # Обычная строка с данными
             if current_bvu_name and current_region_name and row_values[0] is not None:
-                current_region_data.append(row_list)
+                # Кортеж значений записывается как есть, без копирования в список
+                current_region_data.append(row_values)
                 data_rows_collected += 1
                 if data_rows_collected % 500 == 0:
                     logging.debug(
@@ -268,7 +398,9 @@ def split_excel_file_by_merges(input_path, output_base_dir, header_rows_count, m
                     )
 
         # Лог прогресса
-        if processed_rows_count % 2000 == 0:
+        if row_idx >= next_progress_row:
+            next_progress_row += 2000
+            processed_rows_count = row_idx - header_rows_count
             elapsed = time.time() - iter_start
             logging.info(
                 "  Обработано %d строк (%.2f строк/сек)",
@@ -277,35 +409,182 @@ def split_excel_file_by_merges(input_path, output_base_dir, header_rows_count, m
 
     # После цикла: сохраняем остатки
     if current_bvu_name and current_region_name and current_region_data:
-        save_region_file_optimized(
-            header_rows_data, current_region_data,
-            current_bvu_folder_path, current_region_name,
-            source_col_widths, header_merged_ranges
-        )
+        save_region(current_region_data,
+                    current_bvu_folder_path, current_region_name)
         files_saved_count += 1
+    collect_written(wait_all=True)
+    return files_saved_count
 
-    data_wb.close()
-    logging.info(
-        "Завершено. Файлов сохранено: %d. Всего времени: %.2f сек",
-        files_saved_count, time.time() - total_start_time
+
+@dataclass(frozen=True)
+class HeaderTemplate:
+    """Шапка файлов регионов, подготовленная один раз за запуск (см. build_header_template)."""
+    rows: Tuple[list, ...]
+    # (первый столбец, последний столбец, ширина) — как элементы <col> исходного листа
+    col_widths: Tuple[Tuple[int, int, float], ...]
+    merged_ranges: Tuple[str, ...]
+    # Номер строки (с 1), в первую ячейку которой ставится ссылка на инструкцию
+    link_row: int = 3
+    # Готовый XLSX-пакет с этой шапкой для небольших регионов (None — только openpyxl)
+    package: Optional["RegionPackage"] = None
+
+
+@dataclass(frozen=True)
+class RegionPackage:
+    """
+    XLSX-файл региона без строк данных, сохранённый openpyxl один раз за запуск:
+    части пакета в порядке записи (лист — None) и XML листа до и после строк данных.
+    """
+    parts: Tuple[Tuple[str, Optional[bytes]], ...]
+    sheet_head: str
+    sheet_tail: str
+    # Номер стиля формата даты/времени для каждого типа значения
+    date_styles: Dict[type, int]
+
+
+def build_header_template(header_data, source_col_widths, header_merged_ranges):
+    """
+    Готовит шапку для файлов регионов: строки заголовка, ширины столбцов и
+    объединения (только корректные диапазоны). Строка инструкции получает
+    гиперссылку при записи каждого файла.
+    """
+    merged_ranges = []
+    for rng in header_merged_ranges:
+        try:
+            merged_ranges.append(CellRange(rng).coord)
+        except Exception as e:
+            logging.warning("        Не удалось объединить %s: %s", rng, e)
+    header_template = HeaderTemplate(
+        rows=tuple(list(row) for row in header_data),
+        col_widths=tuple(source_col_widths),
+        merged_ranges=tuple(merged_ranges),
     )
+    return replace(header_template, package=build_region_package(header_template))
+
+
+def new_region_workbook(header_template: HeaderTemplate):
+    """Создаёт write-only книгу региона с уже записанной шапкой; возвращает (книга, лист)."""
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet()
+    # Ширины и объединения задаются до первой строки: write-only лист пишет их в шапку XML
+    column_dimensions = ws.column_dimensions
+    for min_col, max_col, width in header_template.col_widths:
+        dimension = column_dimensions[get_column_letter(min_col)]
+        dimension.width = width
+        # Диапазон столбцов сохраняется целиком, как в исходном <col>
+        dimension.min, dimension.max = min_col, max_col
+    ws.merged_cells = MultiCellRange(header_template.merged_ranges)
+
+    # Гиперссылка на инструкцию — в первой ячейке строки инструкции
+    link_cell = WriteOnlyCell(ws, value=INSTRUCTION_TEXT)
+    link_cell.hyperlink = INSTRUCTION_URL
+    link_cell.font = HYPERLINK_FONT
+
+    append = ws.append
+    link_row = header_template.link_row
+    for row_number, row in enumerate(header_template.rows, start=1):
+        append([link_cell, *row[1:]] if row_number == link_row else row)
+    return wb, ws
+
+
+def build_region_package(header_template: HeaderTemplate) -> Optional[RegionPackage]:
+    """
+    Сохраняет в память книгу региона без данных и разбирает её на части для
+    write_region_package. Возвращает None, если пакет подготовить не удалось.
+    """
+    try:
+        wb, ws = new_region_workbook(header_template)
+        # Стили дат регистрируются в книге заранее, чтобы попасть в styles.xml
+        date_styles = {
+            value_type: WriteOnlyCell(ws, value=sample).style_id
+            for value_type, sample in _DATE_SAMPLES
+        }
+        buffer = BytesIO()
+        wb.save(buffer)
+        with zipfile.ZipFile(buffer) as archive:
+            parts = tuple(
+                (name, None if name == _SHEET_PART else archive.read(name))
+                for name in archive.namelist())
+            sheet_xml = archive.read(_SHEET_PART).decode("utf-8")
+    except Exception as e:
+        logging.warning(
+            "    Не удалось подготовить шаблон файла региона, файлы будут записаны через openpyxl: %s", e)
+        return None
+
+    sheet_head, sheet_data_end, sheet_tail = sheet_xml.partition("</sheetData>")
+    if not sheet_data_end:
+        return None
+    return RegionPackage(parts, sheet_head, sheet_data_end + sheet_tail, date_styles)
+
+
+def region_rows_xml(region_data, first_row, date_styles) -> Optional[str]:
+    """
+    Строки данных региона в XML листа — так же, как их записал бы openpyxl.
+    Возвращает None, если встретилось значение, которое умеет записать только
+    openpyxl (формулы, коды ошибок, недопустимые символы, прочие типы).
+    """
+    parts = []
+    append = parts.append
+    for row_number, row in enumerate(region_data, start=first_row):
+        append(f'<row r="{row_number}">')
+        for col_idx, value in enumerate(row, start=1):
+            if value is None:
+                continue
+            ref = f"{get_column_letter(col_idx)}{row_number}"
+            value_type = type(value)
+            if value_type is str:
+                value = value[:32767]
+                if (ILLEGAL_CHARACTERS_RE.search(value) or value in ERROR_CODES
+                        or (len(value) > 1 and value.startswith("="))):
+                    return None
+                if not value:
+                    append(f'<c r="{ref}" t="inlineStr" />')
+                    continue
+                stripped = value.strip()
+                space = ' xml:space="preserve"' if stripped and stripped != value else ""
+                append(
+                    f'<c r="{ref}" t="inlineStr"><is><t{space}>{escape(value)}</t></is></c>')
+            elif value_type is int or value_type is float:
+                if not isfinite(value):
+                    return None
+                append(f'<c r="{ref}" t="n"><v>{value:.16g}</v></c>')
+            elif value_type is bool:
+                append(f'<c r="{ref}" t="b"><v>{value:d}</v></c>')
+            elif value_type in date_styles and getattr(value, "tzinfo", None) is None:
+                append(
+                    f'<c r="{ref}" s="{date_styles[value_type]}" t="n"><v>{to_excel(value):.16g}</v></c>')
+            else:
+                return None
+        append("</row>")
+    return "".join(parts)
+
+
+def write_region_package(package: RegionPackage, rows_xml: str, filepath) -> None:
+    """Записывает файл региона: части пакета шаблона и лист со строками данных."""
+    sheet_xml = (package.sheet_head + rows_xml + package.sheet_tail).encode("utf-8")
+    with zipfile.ZipFile(filepath, "w", zipfile.ZIP_DEFLATED, allowZip64=True) as archive:
+        for name, content in package.parts:
+            archive.writestr(name, sheet_xml if content is None else content)
 
 
-def save_region_file_optimized(header_data, region_data, bvu_folder_path, region_name,
-                               source_col_widths, header_merged_ranges):
+def save_region_file_optimized(header_template: HeaderTemplate, region_data, bvu_folder_path, region_name):
     """
-    Создает и сохраняет новый Excel-файл для указанного региона в режиме write_only (streaming).
-    После сохранения повторно открывает файл для применения объединений заголовка.
+    Создает и сохраняет новый Excel-файл для указанного региона.
+    Файл пишется потоково (write-only) за один проход: шапка из шаблона
+    (см. build_header_template), объединения, гиперссылка и строки данных региона.
+    Небольшие регионы пишутся без openpyxl: в готовый пакет шаблона
+    добавляются только строки данных (см. write_region_package).
+    Возвращает путь сохранённого файла или None, если файл не записан.
     """
     if not region_data:
         logging.info(
             "    Пропуск сохранения для '%s' — нет данных.", region_name)
-        return
+        return None
 
     if not bvu_folder_path or not region_name:
         logging.warning("    Пропуск сохранения — неверный путь '%s' или имя региона '%s'.",
                         bvu_folder_path, region_name)
-        return
+        return None
     if not bvu_folder_path.exists():
         try:
             bvu_folder_path.mkdir(parents=True, exist_ok=True)
@@ -313,60 +592,38 @@ def save_region_file_optimized(header_data, region_data, bvu_folder_path, region
         except Exception as e:
             logging.error("    Не удалось создать папку '%s': %s",
                           bvu_folder_path, e)
-            return
+            return None
 
     filename = f"{region_name}.xlsx"
     filepath = bvu_folder_path / filename
 
     try:
         start_time = time.time()
-        logging.info("      Начало стриминговой записи файла: %s", filepath)
-
-        # 1) Стриминговая запись: write_only
-        wb_stream = openpyxl.Workbook(write_only=True)
-        ws_stream = wb_stream.create_sheet()
-
-        # 1.1) Шапка без объединений
-        for row in header_data:
-            ws_stream.append(row)
-        # 1.2) Ширины колонок
-        for col_idx, width in source_col_widths.items():
-            ws_stream.column_dimensions[get_column_letter(
-                col_idx)].width = width
-        # 1.3) Данные региона
-        for row in region_data:
-            ws_stream.append(row)
-
-        wb_stream.save(filepath)
-        elapsed = time.time() - start_time
-        logging.info("      Стриминговая запись завершена (%.2f сек)", elapsed)
-
-        # 2) Применение объединений через повторное открытие
-        if header_merged_ranges:
-            wb_norm = openpyxl.load_workbook(filepath)
-            ws_norm = wb_norm.active
-            for rng in header_merged_ranges:
-                try:
-                    ws_norm.merge_cells(rng)
-                except Exception as e:
-                    logging.warning(
-                        "        Не удалось объединить %s: %s", rng, e)
-
-            # --- Добавление гиперссылки на строку инструкции ---
-            try:
-                link_cell = ws_norm.cell(row=3, column=1)
-                link_cell.value = "Инструкция по использованию KML"
-                link_cell.hyperlink = "https://www.rudi.ru/kml-instruction.php"
-                link_cell.font = Font(color="0000FF", underline="single")
-            except Exception as e:
-                logging.warning(
-                    "        Не удалось добавить гиперссылку: %s", e)
+        logging.info("      Начало записи файла: %s", filepath)
 
-            wb_norm.save(filepath)
+        package = header_template.package
+        rows_xml = None
+        if package is not None and len(region_data) < SMALL_REGION_ROWS:
+            rows_xml = region_rows_xml(
+                region_data, len(header_template.rows) + 1, package.date_styles)
+
+        if rows_xml is not None:
+            write_region_package(package, rows_xml, filepath)
+        else:
+            wb, ws = new_region_workbook(header_template)
+            append = ws.append
+            for row in region_data:
+                append(row)
+            wb.save(filepath)
+
+        elapsed = time.time() - start_time
+        logging.info("      Запись завершена (%.2f сек)", elapsed)
+        return filepath
 
     except Exception as e:
         logging.exception(
             "      Ошибка при сохранении файла %s: %s", filepath, e)
+        return None
 
 
 def save_region_file(header_data, region_data, bvu_folder_path, region_name, source_sheet, header_row_count):
@@ -1,4 +1,7 @@
+import heapq
+import re
 import time
+from collections import Counter
 from dataclasses import dataclass, field
 from typing import Any, Dict, List, Optional
 
@@ -10,6 +13,24 @@ from src.xlsx_to_kml import ConversionResult
 
 console = Console()
 
+# Variable error messages (counts, coordinates) are grouped under a common name for the report
+_ERROR_GROUPS = tuple((re.compile(pattern), group_name) for pattern, group_name in {
+    r'Нечетное количество найденных ДМС координат \(\d+\)': 'Нечетное количество найденных ДМС координат',
+    r'Нечетное количество найденных ЛМС координат \(\d+\)': 'Нечетное количество найденных ЛМС координат',
+    r'Координаты ДМС вне допустимого диапазона WGS84 \(lat=[-\d.]+, lon=[-\d.]+\)': 'Координаты ДМС вне допустимого диапазона WGS84',
+    r'Координаты МСК вне допустимого диапазона WGS84 \(lat=[-\d.]+, lon=[-\d.]+\)': 'Координаты МСК вне допустимого диапазона WGS84',
+    r'Ошибка трансформации МСК координат: .+': 'Ошибка трансформации МСК координат',
+    r'Обнаружены аномальные координаты, значительно удаленные от других': 'Обнаружены аномальные координаты, значительно удаленные от других'
+}.items())
+
+
+def _error_group(error: str) -> str:
+    for pattern, group_name in _ERROR_GROUPS:
+        # Every pattern starts with its group name, so a cheap prefix check rules out most groups
+        if error.startswith(group_name) and pattern.match(error):
+            return group_name
+    return error[:80] + "..." if len(error) > 80 else error
+
 
 @dataclass
 class ProcessingStats:
@@ -50,9 +71,8 @@ class ProcessingStats:
             if result.total_rows > 0 and result.failure_rate > 0
         ]
 
-        sorted_files = sorted(
-            files_with_issues, key=lambda x: x.failure_rate, reverse=True)
-        return sorted_files[:top_n]
+        # Only the top few are shown, so they are selected without sorting every file
+        return heapq.nlargest(top_n, files_with_issues, key=lambda x: x.failure_rate)
 
     def calculate_quality_score(self) -> Dict[str, Any]:
         totals = self.get_total_stats()
@@ -66,40 +86,21 @@ class ProcessingStats:
         completeness_score = max(
             0, 100 - (totals['failed_rows'] / totals['total_rows']) * 50)
 
-        all_errors: List[str] = []
+        # Each file reports its errors already counted per reason
+        all_errors: Counter[str] = Counter()
         for result in self.file_results.values():
-            all_errors.extend(result.error_reasons)
+            all_errors.update(result.error_reasons)
 
-        unique_errors = len(set(all_errors)) if all_errors else 0
+        unique_errors = len(all_errors)
 
         error_analysis = None
         if all_errors:
-            from collections import Counter
-            import re
-
             grouped_errors: Counter[str] = Counter()
-            error_patterns = {
-                r'Нечетное количество найденных ДМС координат \(\d+\)': 'Нечетное количество найденных ДМС координат',
-                r'Нечетное количество найденных ЛМС координат \(\d+\)': 'Нечетное количество найденных ЛМС координат',
-                r'Координаты ДМС вне допустимого диапазона WGS84 \(lat=[-\d.]+, lon=[-\d.]+\)': 'Координаты ДМС вне допустимого диапазона WGS84',
-                r'Координаты МСК вне допустимого диапазона WGS84 \(lat=[-\d.]+, lon=[-\d.]+\)': 'Координаты МСК вне допустимого диапазона WGS84',
-                r'Ошибка трансформации МСК координат: .+': 'Ошибка трансформации МСК координат',
-                r'Обнаружены аномальные координаты, значительно удаленные от других': 'Обнаружены аномальные координаты, значительно удаленные от других'
-            }
-
-            for error in all_errors:
-                grouped = False
-                for pattern, group_name in error_patterns.items():
-                    if re.match(pattern, error):
-                        grouped_errors[group_name] += 1
-                        grouped = True
-                        break
-                if not grouped:
-                    display_error = error[:80] + "..." if len(error) > 80 else error
-                    grouped_errors[display_error] += 1
+            for error, count in all_errors.items():
+                grouped_errors[_error_group(error)] += count
 
             error_analysis = {
-                'total_errors': len(all_errors),
+                'total_errors': sum(all_errors.values()),
                 'unique_types': len(grouped_errors),
                 'top_errors': grouped_errors.most_common(10)
             }
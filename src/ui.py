@@ -7,6 +7,7 @@ from rich.table import Table
 from rich.prompt import Prompt, IntPrompt, FloatPrompt
 
 from src.config import Config
+from src.utils import find_xlsx_files
 
 
 # Single console instance for the whole app
@@ -150,9 +151,7 @@ def choose_demo_files_mode(config: Config) -> Optional[str]:
         return None
 
     # Count available files
-    xlsx_files = list(xlsx_dir.rglob('*.xlsx'))
-    # Filter out temp files
-    xlsx_files = [f for f in xlsx_files if not f.name.startswith('~$')]
+    xlsx_files = [Path(p) for p in find_xlsx_files(config.xlsx_output_dir)]
 
     if not xlsx_files:
         console.print(Panel(
@@ -198,9 +197,7 @@ def choose_demo_files_mode(config: Config) -> Optional[str]:
 def choose_xlsx_file(config: Config) -> Optional[str]:
     """Choose a single xlsx file from the xlsx output directory."""
     xlsx_dir = Path(config.xlsx_output_dir)
-    xlsx_files = list(xlsx_dir.rglob('*.xlsx'))
-    # Filter out temp files
-    xlsx_files = [f for f in xlsx_files if not f.name.startswith('~$')]
+    xlsx_files = [Path(p) for p in find_xlsx_files(config.xlsx_output_dir)]
 
     if not xlsx_files:
         return None
@@ -1,10 +1,17 @@
 import logging
+import logging.handlers
 import math
+import os
 import random
+from contextlib import contextmanager
 from datetime import datetime
 from pathlib import Path
+from typing import Any, Iterator, List
 import colorlog  # Import colorlog
 
+# zipfile issues many small reads against the archive; a large buffer turns them into few syscalls
+XLSX_READ_BUFFER_SIZE = 1024 * 1024
+
 
 class FilenameLoggerAdapter(logging.LoggerAdapter):
     """Logger adapter that automatically includes filename in log messages."""
@@ -23,6 +30,39 @@ class FilenameLoggerAdapter(logging.LoggerAdapter):
             return f"- {self.filename} - {msg}", kwargs
         return msg, kwargs
 
+    def log(self, level, msg, *args, **kwargs):
+        """Log with the filename prefix, keeping %-style arguments lazy."""
+        if self.isEnabledFor(level):
+            if args and self.filename and "%" in self.filename:
+                # The prefix becomes part of the format string, so escape it
+                msg, kwargs = f"- {self.filename.replace('%', '%%')} - {msg}", kwargs
+            else:
+                msg, kwargs = self.process(msg, kwargs)
+            self.logger.log(level, msg, *args, **kwargs)
+
+
+def find_xlsx_files(root: str) -> List[str]:
+    """Recursively collects paths of .xlsx files under root, skipping Excel lock files (~$*).
+
+    Uses os.scandir directly: file/dir checks come from the directory listing
+    itself, with no per-entry stat and no Path object per entry.
+    """
+    found: List[str] = []
+    pending = [root]
+    while pending:
+        current = pending.pop()
+        try:
+            with os.scandir(current) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        pending.append(entry.path)
+                    elif (entry.name.endswith('.xlsx') and not entry.name.startswith('~$')
+                          and entry.is_file()):
+                        found.append(entry.path)
+        except OSError:
+            continue
+    return found
+
 
 def generate_random_color() -> str:
     """Рандомный цвет в KML формате."""
@@ -44,6 +84,64 @@ def sort_coordinates(coords):
     return sorted(coords, key=lambda coord: calculate_angle(coord, centroid))
 
 
+@contextmanager
+def console_log_level(level: int) -> Iterator[None]:
+    """Temporarily sets all console (stream) handlers of the root logger to ``level``."""
+    previous_levels = [
+        (handler, handler.level)
+        for handler in logging.getLogger().handlers
+        if isinstance(handler, logging.StreamHandler)
+        and not isinstance(handler, logging.FileHandler)
+    ]
+    for handler, _ in previous_levels:
+        handler.setLevel(level)
+    try:
+        yield
+    finally:
+        for handler, previous_level in previous_levels:
+            handler.setLevel(previous_level)
+
+
+class _LevelGate(logging.Handler):
+    """Passes records at or above its own level on to another handler."""
+
+    def __init__(self, target: logging.Handler, level: int) -> None:
+        super().__init__(level)
+        self.target = target
+
+    def emit(self, record: logging.LogRecord) -> None:
+        self.target.handle(record)
+
+
+def start_worker_log_listener(log_queue: Any, console_level: int = logging.ERROR) -> logging.handlers.QueueListener:
+    """Starts a background listener writing worker log records through this process's handlers.
+
+    Log files receive every record; console handlers only those at ``console_level``
+    or above, so worker output on the console stays as quiet as before.
+    """
+    handlers = [
+        handler if isinstance(handler, logging.FileHandler) else _LevelGate(handler, console_level)
+        for handler in logging.getLogger().handlers
+    ]
+    listener = logging.handlers.QueueListener(
+        log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    return listener
+
+
+def setup_queue_logging(log_queue: Any) -> None:
+    """Routes all logging of the current (worker) process into ``log_queue``.
+
+    Logging calls then only enqueue the record; file I/O happens in the
+    parent's listener thread.
+    """
+    root_logger = logging.getLogger()
+    for handler in root_logger.handlers[:]:
+        root_logger.removeHandler(handler)
+    root_logger.addHandler(logging.handlers.QueueHandler(log_queue))
+    root_logger.setLevel(logging.DEBUG)
+
+
 def setup_logging(output_dir=None, console_level=logging.DEBUG):
     """Настраивает систему логирования с цветным выводом в консоль.
     
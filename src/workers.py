@@ -1,12 +1,38 @@
 import logging
 from pathlib import Path
-from typing import Any, Optional, Tuple
+from typing import Any, Dict, Optional, Tuple
 
 from openpyxl import load_workbook
+from pyproj import Transformer
 
-from src.utils import setup_logging
+from src.utils import XLSX_READ_BUFFER_SIZE, setup_logging, setup_queue_logging
 from src.xlsx_to_kml import create_kml_from_coordinates, ConversionResult, get_transformers
 from src.config import Config
+from src.xlsx_to_kml.parsing import _get_sk42_transformer
+
+# Set once per worker by initialize_worker, so tasks do not carry the config themselves
+_worker_config: Optional[Config] = None
+
+# proj4 path -> transformers of this process, or None if loading them failed.
+# A failure is remembered too, so it is not retried (and logged) for every file.
+_CACHED_TRANSFORMERS: Dict[str, Optional[Dict[str, Transformer]]] = {}
+
+
+def cached_transformers(proj4_path: str) -> Optional[Dict[str, Transformer]]:
+    """Returns the MSK transformers for ``proj4_path``, loading them at most once per process.
+
+    None means they could not be loaded; MSK rows then fail to parse with a per-row error.
+    """
+    try:
+        return _CACHED_TRANSFORMERS[proj4_path]
+    except KeyError:
+        pass
+    try:
+        transformers: Optional[Dict[str, Transformer]] = get_transformers(proj4_path)
+    except Exception:
+        transformers = None
+    _CACHED_TRANSFORMERS[proj4_path] = transformers
+    return transformers
 
 
 def initialize_worker_logging() -> None:
@@ -14,38 +40,65 @@ def initialize_worker_logging() -> None:
     setup_logging(console_level=logging.ERROR)
 
 
+def initialize_worker(config: Config, log_queue: Any = None) -> None:
+    """Pool initializer: sets up logging, stores the run config and warms the transformer caches.
+
+    With ``log_queue`` the worker's records are sent to the parent's listener
+    instead of to log files of its own. The PROJ pipelines are built once per
+    worker here instead of inside the first task each worker picks up.
+    """
+    global _worker_config
+    _worker_config = config
+    if log_queue is not None:
+        setup_queue_logging(log_queue)
+    else:
+        initialize_worker_logging()
+    cached_transformers(config.proj4_path)
+    try:
+        _get_sk42_transformer()
+    except Exception:
+        # Tasks retry lazily and report the failure per file
+        pass
+
+
 def process_file_worker(
     xlsx_file_path: str,
     kml_file_path: str,
-    xlsx_output_dir: str,
-    kml_output_dir: str
+    config: Optional[Config] = None,
+    demo_percentage: Optional[float] = None
 ) -> Tuple[bool, str, Optional[ConversionResult], Optional[str]]:
     """
     Worker function for parallel file processing.
 
+    The directory of ``kml_file_path`` must already exist; the parent process
+    creates all output directories before dispatching tasks. Without an explicit
+    ``config`` the one given to initialize_worker is used. ``demo_percentage``
+    limits the conversion to the first N% of data rows (demo maps).
+
     Returns:
         Tuple of (success, filename, conversion_result, error_message)
     """
 
+    if config is None:
+        config = _worker_config if _worker_config is not None else Config()
+
     try:
         filename = Path(xlsx_file_path).name
-        Path(kml_file_path).parent.mkdir(parents=True, exist_ok=True)
-        workbook = load_workbook(
-            filename=xlsx_file_path, data_only=True, read_only=True)
-        # Load transformers lazily (cached per-process)
-        transformers = None
-        try:
-            transformers = get_transformers()
-        except Exception:
-            # If transformers cannot be loaded, MSK parsing will return an error per-row; continue
-            transformers = None
-        conversion_result = create_kml_from_coordinates(
-            workbook.active,
-            output_file=kml_file_path,
-            filename=filename,
-            transformers=transformers,
-            config=Config()
-        )
+        with open(xlsx_file_path, 'rb', buffering=XLSX_READ_BUFFER_SIZE) as xlsx_file:
+            workbook = load_workbook(
+                filename=xlsx_file, data_only=True, read_only=True, keep_links=False)
+            try:
+                conversion_result = create_kml_from_coordinates(
+                    workbook.active,
+                    output_file=kml_file_path,
+                    filename=filename,
+                    transformers=cached_transformers(config.proj4_path),
+                    config=config,
+                    demo_percentage=demo_percentage
+                )
+            finally:
+                # Read-only workbooks keep the archive open until closed
+                workbook.close()
 
         return True, filename, conversion_result, None
 
@@ -53,3 +106,38 @@ def process_file_worker(
         filename = Path(xlsx_file_path).name if xlsx_file_path else "Unknown"
         error_message = f"Error converting {filename}: {str(e)}"
         return False, filename, None, error_message
+
+
+def process_demo_file_worker(
+    xlsx_file_path: str,
+    kml_file_path: str,
+    demo_percentage: float,
+    config: Optional[Config] = None
+) -> Tuple[bool, str, Optional[ConversionResult], Optional[str]]:
+    """
+    Worker function for demo maps: converts the first ``demo_percentage`` % of rows.
+
+    A demo without any converted rows counts as a failure and its KML file is removed.
+
+    Returns:
+        Tuple of (success, filename, conversion_result, error_message)
+    """
+    success, filename, conversion_result, error_message = process_file_worker(
+        xlsx_file_path, kml_file_path, config, demo_percentage=demo_percentage)
+    if success and conversion_result is not None and conversion_result.successful_rows == 0:
+        try:
+            Path(kml_file_path).unlink(missing_ok=True)
+        except OSError:
+            pass
+        return False, filename, None, f"Demo file would be empty for {filename}, skipped"
+    return success, filename, conversion_result, error_message
+
+
+def process_file_worker_unpack(args: Dict[str, Any]) -> Tuple[bool, str, Optional[ConversionResult], Optional[str]]:
+    """Single-argument shim around process_file_worker for ``executor.map``."""
+    return process_file_worker(**args)
+
+
+def process_demo_file_worker_unpack(args: Dict[str, Any]) -> Tuple[bool, str, Optional[ConversionResult], Optional[str]]:
+    """Single-argument shim around process_demo_file_worker for ``executor.map``."""
+    return process_demo_file_worker(**args)
@@ -28,13 +28,13 @@ def detect_coordinate_anomalies(
     distances: list[tuple[int, float]] = []
     anomalous_points: list[tuple[int, str, float, float]] = []
 
-    for i, point_i in enumerate(coordinates):
-        lon_i = point_i.lon
-        lat_i = point_i.lat
+    # Points are unpacked once up front instead of on every pass of the inner loop
+    lat_lon = [(lat, lon) for _, lon, lat in coordinates]
+    for i, (lat_i, lon_i) in enumerate(lat_lon):
         point_distances: list[float] = []
-        for j, point_j in enumerate(coordinates):
+        for j, (lat_j, lon_j) in enumerate(lat_lon):
             if i != j:
-                dist = haversine_distance(lat_i, lon_i, point_j.lat, point_j.lon)
+                dist = haversine_distance(lat_i, lon_i, lat_j, lon_j)
                 point_distances.append(dist)
 
         avg_distance = sum(point_distances) / len(point_distances)
@@ -42,8 +42,8 @@ def detect_coordinate_anomalies(
 
     for idx, avg_dist in distances:
         if avg_dist > threshold_km:
-            p = coordinates[idx]
-            anomalous_points.append((idx, p.name, p.lon, p.lat))
+            name, lon, lat = coordinates[idx]
+            anomalous_points.append((idx, name, lon, lat))
 
     if anomalous_points:
         reason = "Обнаружены аномальные координаты, значительно удаленные от других"
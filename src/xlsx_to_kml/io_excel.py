@@ -1,4 +1,4 @@
-from typing import List, Dict
+from typing import List, Dict, Optional, Sequence, Tuple
 import logging
 from openpyxl.utils import get_column_letter
 from src.config import Config
@@ -6,17 +6,27 @@ from src.config import Config
 logger = logging.getLogger(__name__)
 
 
-def find_column_index(sheet, target_names: List[str], exact_match: bool = False) -> int:
-    """Находит индекс столбца для любого из заданных имен заголовков в строках 1-8."""
-    target_names_lower = [str(name).lower().strip() for name in target_names]
-    for row in sheet.iter_rows(min_row=1, max_row=8, values_only=True):
+def read_header_cells(sheet, max_row: int = 8) -> List[Tuple[int, str]]:
+    """Считывает непустые ячейки строк 1-8 как пары (индекс столбца, нормализованный текст)."""
+    header_cells: List[Tuple[int, str]] = []
+    for row in sheet.iter_rows(min_row=1, max_row=max_row, values_only=True):
         for idx, cell in enumerate(row):
             if cell:
-                cell_str_lower = str(cell).lower().strip()
-                for target_name_lower in target_names_lower:
-                    if (exact_match and cell_str_lower == target_name_lower) or \
-                       (not exact_match and target_name_lower in cell_str_lower):
-                        return idx
+                header_cells.append((idx, str(cell).lower().strip()))
+    return header_cells
+
+
+def find_column_index(sheet, target_names: Sequence[str], exact_match: bool = False,
+                      header_cells: Optional[List[Tuple[int, str]]] = None) -> int:
+    """Находит индекс столбца для любого из заданных имен заголовков в строках 1-8."""
+    if header_cells is None:
+        header_cells = read_header_cells(sheet)
+    target_names_lower = [str(name).lower().strip() for name in target_names]
+    for idx, cell_str_lower in header_cells:
+        for target_name_lower in target_names_lower:
+            if (exact_match and cell_str_lower == target_name_lower) or \
+               (not exact_match and target_name_lower in cell_str_lower):
+                return idx
     return -1
 
 
@@ -25,13 +35,17 @@ def get_column_indices(sheet, config: Config | None = None) -> dict:
     if config is None:
         config = Config()
 
-    columns: Dict[str, List[str]] = config.excel_columns
-    exact_match_keys = set(config.excel_exact_match_keys)
+    columns: Dict[str, Tuple[str, ...]] = config.excel_columns
+    exact_match_keys = config.excel_exact_match_keys
+
+    # Строки заголовка читаются один раз и переиспользуются для всех ключей
+    header_cells = read_header_cells(sheet)
 
     indices: dict = {}
     for key, value in columns.items():
         exact = key in exact_match_keys
-        indices[key] = find_column_index(sheet, value, exact_match=exact)
+        indices[key] = find_column_index(
+            sheet, value, exact_match=exact, header_cells=header_cells)
 
     original_names = {key: value[0] for key, value in columns.items()}
     for key, value in indices.items():
@@ -1,43 +1,70 @@
-from typing import List, Tuple
+from typing import List, NamedTuple, Tuple
 import simplekml
 from src.config import Config
 from src.utils import generate_random_color
 
 
-def create_kml_point(kml, name: str, coords: Tuple[float, float], description: str, color: str | None = None, config: Config | None = None) -> None:
-    if config is None:
-        config = Config()
+class KmlStyle(NamedTuple):
+    """KML styling values from Config, resolved once per sheet instead of per placemark."""
+    icon_scale: float
+    label_scale: float
+    line_width: int
+    polygon_line_width: int
+    polygon_alpha: int
+
+
+def kml_style_from_config(config: Config) -> KmlStyle:
+    return KmlStyle(
+        icon_scale=config.kml_icon_scale,
+        label_scale=config.kml_label_scale,
+        line_width=config.kml_line_width,
+        polygon_line_width=config.kml_polygon_line_width,
+        polygon_alpha=config.kml_polygon_alpha,
+    )
+
+
+DEFAULT_KML_STYLE = kml_style_from_config(Config())
+
+
+def create_kml_point(kml, name: str, coords: Tuple[float, float], description: str, color: str | None = None, style: KmlStyle = DEFAULT_KML_STYLE) -> None:
     if color is None:
         color = generate_random_color()
     point = kml.newpoint(name=name, coords=[coords])
     point.description = description
     point.style.iconstyle.color = color
-    point.style.iconstyle.scale = config.kml_icon_scale
-    point.style.labelstyle.scale = config.kml_label_scale
+    point.style.iconstyle.scale = style.icon_scale
+    point.style.labelstyle.scale = style.label_scale
 
 
-def create_kml_line(kml, name: str, coords: List[Tuple[float, float]], description: str, color: str | None = None, config: Config | None = None):
-    if config is None:
-        config = Config()
+def create_kml_line(kml, name: str, coords: List[Tuple[float, float]], description: str, color: str | None = None, style: KmlStyle = DEFAULT_KML_STYLE):
     if color is None:
         color = generate_random_color()
     line = kml.newlinestring(name=name, coords=coords)
     line.style.linestyle.color = color
-    line.style.linestyle.width = config.kml_line_width
+    line.style.linestyle.width = style.line_width
     line.description = description
     return line
 
 
-def create_kml_polygon(kml, name: str, coords: List[Tuple[float, float]], description: str, color: str | None = None, config: Config | None = None):
-    if config is None:
-        config = Config()
+def create_kml_polygon(kml, name: str, coords: List[Tuple[float, float]], description: str, color: str | None = None, style: KmlStyle = DEFAULT_KML_STYLE):
     if color is None:
         color = generate_random_color()
     polygon = kml.newpolygon(name=name)
     polygon.outerboundaryis = coords  # type: ignore
     polygon.style.linestyle.color = color
-    polygon.style.linestyle.width = config.kml_polygon_line_width
+    polygon.style.linestyle.width = style.polygon_line_width
     polygon.style.polystyle.color = simplekml.Color.changealphaint(
-        config.kml_polygon_alpha, color)
+        style.polygon_alpha, color)
     polygon.description = description
     return polygon
+
+
+def save_kml(kml: simplekml.Kml, output_file: str) -> None:
+    """Writes the document as compact XML.
+
+    ``Kml.save`` pretty-prints by re-parsing the whole document with minidom, which
+    costs more than building it; viewers do not need the indentation.
+    """
+    with open(output_file, "w", encoding="utf-8") as kml_file:
+        kml_file.write('<?xml version="1.0" encoding="UTF-8"?>\n')
+        kml_file.write(kml.kml(format=False))
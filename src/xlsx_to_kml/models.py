@@ -1,6 +1,7 @@
+from collections import Counter
 from dataclasses import dataclass, field
 from enum import Enum
-from typing import List, Optional
+from typing import List, NamedTuple, Optional
 
 
 class ParseError(Exception):
@@ -62,23 +63,33 @@ def generate_point_name(main_name: str, water_type: WaterUsageType, index: int,
             return base_name
 
 
-@dataclass(frozen=True)
-class Point:
-    """Typed representation of a geographic point."""
+class Point(NamedTuple):
+    """Typed representation of a geographic point.
+
+    A NamedTuple rather than a dataclass so hot loops can unpack it
+    directly: ``for name, lon, lat in points``.
+    """
     name: str
     lon: float
     lat: float
 
 
-@dataclass
+@dataclass(slots=True)
 class ConversionResult:
-    """Result of converting a single file to KML."""
+    """Result of converting a single file to KML.
+
+    Slotted: one instance per file crosses the process boundary and stays in
+    ProcessingStats for the whole session. Not frozen, since the pipeline
+    fills the counters in as it goes.
+    """
     filename: str
     total_rows: int = 0
     successful_rows: int = 0
     failed_rows: int = 0
     anomaly_rows: int = 0
-    error_reasons: List[str] = field(default_factory=list)
+    # Parse error message -> number of rows that failed with it. Kept as counts
+    # so the result sent back from a worker stays small however many rows fail.
+    error_reasons: Counter[str] = field(default_factory=Counter)
     processing_time: float = 0.0
     anomaly_file_created: bool = False
 
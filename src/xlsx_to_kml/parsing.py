@@ -15,6 +15,10 @@ from src.config import Config
 
 logger = logging.getLogger(__name__)
 
+# Reference data for SK-42 detection: YAML, with the legacy JSON as a fallback
+OBJECTS_INFO_YAML_PATH = "data/objects_info.yaml"
+OBJECTS_INFO_JSON_PATH = "data/objects_info.json"
+
 
 # Compiled regex patterns
 MSK_COORD_PATTERN = re.compile(r'(\d+):\s*([-\d.]+)\s*м\.,\s*([-\d.]+)\s*м\.')
@@ -22,6 +26,10 @@ DMS_COORD_PATTERN = re.compile(
     r'(\d+)[°º]\s*(\d+)[\'′΄]\s*(\d+(?:[.,]\d+)?)[\"″′′˝]')
 DMS_POINT_PATTERN = re.compile(r'(\d+)[:.]\s*(?=\d+[°º])')
 ALT_POINT_PATTERN = re.compile(r'точка\s*(\d+)', re.IGNORECASE)
+# Признак МСК: " м." в тексте (в т.ч. ", м.") либо "м." в самом конце строки
+MSK_HINT_PATTERN = re.compile(r' м\.|м\.\Z')
+# Маркер ГСК (без учета регистра) — ищется без создания копии строки через lower()
+GSK_MARKER_PATTERN = re.compile(r'гск', re.IGNORECASE)
 
 
 def looks_like_dms(coord_str: str) -> bool:
@@ -29,11 +37,11 @@ def looks_like_dms(coord_str: str) -> bool:
 
 
 def looks_like_msk(coord_str: str) -> bool:
-    return ((' м.' in coord_str or ', м.' in coord_str or coord_str.endswith('м.')) and '°' not in coord_str)
+    return MSK_HINT_PATTERN.search(coord_str) is not None and '°' not in coord_str
 
 
 def _should_prioritize_dms(coord_str: str) -> bool:
-    return 'гск' in coord_str.lower()
+    return GSK_MARKER_PATTERN.search(coord_str) is not None
 
 
 def _validate_wgs84_range(lat: float, lon: float) -> bool:
@@ -54,24 +62,38 @@ def parse_msk_coordinates(input_string: str, transformer: Transformer) -> List[P
     if not matches:
         return []
 
-    results: List[Point] = []
+    points = []
     for i, x_str, y_str in matches:
         try:
             x_val = float(x_str)
             y_val = float(y_str)
-            if x_val == 0 and y_val == 0:
-                continue
-            lon, lat = transformer.transform(y_val, x_val)
-            if not _validate_wgs84_range(lat, lon):
-                reason = (
-                    f"Координаты МСК вне допустимого диапазона WGS84 (lat={lat}, lon={lon}) после трансформации.")
-                raise ParseError(reason)
-            results.append(
-                Point(name=f"точка {i}", lon=round(lon, 6), lat=round(lat, 6)))
-        except Exception as e:
+        except ValueError as e:
             reason = (
                 f"Ошибка трансформации МСК координат: {e}. Исходные: x='{x_str}', y='{y_str}'.")
             raise ParseError(reason)
+        if x_val == 0 and y_val == 0:
+            continue
+        points.append((i, x_str, y_str, x_val, y_val))
+    if not points:
+        return []
+
+    # Все точки строки преобразуются одним вызовом PROJ
+    try:
+        lons, lats = transformer.transform(
+            [y_val for _, _, _, _, y_val in points], [x_val for _, _, _, x_val, _ in points])
+    except Exception as e:
+        raise ParseError(f"Ошибка трансформации МСК координат: {e}.")
+
+    results: List[Point] = []
+    for (i, x_str, y_str, _, _), lon, lat in zip(points, lons, lats):
+        if not _validate_wgs84_range(lat, lon):
+            range_error = (
+                f"Координаты МСК вне допустимого диапазона WGS84 (lat={lat}, lon={lon}) после трансформации.")
+            reason = (
+                f"Ошибка трансформации МСК координат: {range_error}. Исходные: x='{x_str}', y='{y_str}'.")
+            raise ParseError(reason)
+        results.append(
+            Point(name=f"точка {i}", lon=round(lon, 6), lat=round(lat, 6)))
 
     return results
 
@@ -141,11 +163,11 @@ def parse_dms_coordinates(coord_str: str) -> List[Point]:
             combined_text = f"{cast(str, lat_info['part'])} {cast(str, lon_info['part'])}"
             if _has_standalone_token(combined_text, "ЮШ") or _has_standalone_token(combined_text, "S"):
                 logger.debug(
-                    f"  - ЮШ в строке. Преобразуем широту в отрицательную: {lat} -> {-lat}")
+                    "  - ЮШ в строке. Преобразуем широту в отрицательную: %s -> %s", lat, -lat)
                 lat = -lat
             if _has_standalone_token(combined_text, "ЗД") or _has_standalone_token(combined_text, "W"):
                 logger.debug(
-                    f"  - ЗД в строке. Преобразуем долготу в отрицательную: {lon} -> {-lon}")
+                    "  - ЗД в строке. Преобразуем долготу в отрицательную: %s -> %s", lon, -lon)
                 lon = -lon
 
             if not _validate_wgs84_range(lat, lon):
@@ -222,19 +244,23 @@ def _write_objects_info_yaml(data: Dict[str, List[str]], yaml_path: str) -> None
             for content_line in str(value).splitlines() or [""]:
                 lines.append(f"    {content_line}")
     content = "\n".join(lines) + "\n"
-    with open(yaml_path, "w", encoding="utf-8") as f:
+    # Пишем одним вызовом во временный файл и атомарно подменяем: при сбое
+    # не останется наполовину записанного YAML, который затем не загрузится
+    tmp_path = f"{yaml_path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
         f.write(content)
+    os.replace(tmp_path, yaml_path)
 
 
 @lru_cache(maxsize=1)
-def _load_objects_info(path: str = "data/objects_info.yaml") -> Dict[str, List[str]]:
+def _load_objects_info(path: str = OBJECTS_INFO_YAML_PATH) -> Dict[str, List[str]]:
     """Загружает словарь с информацией об объектах из YAML (fallback: JSON).
 
     Ожидаемый формат:
       system_key: [list of strings]
     """
     yaml_path = path
-    json_path = "data/objects_info.json"
+    json_path = OBJECTS_INFO_JSON_PATH
 
     # Primary: YAML
     if os.path.exists(yaml_path):
@@ -251,7 +277,7 @@ def _load_objects_info(path: str = "data/objects_info.yaml") -> Dict[str, List[s
                 return result
         except Exception as e:
             logger.warning(
-                f"Не удалось загрузить 'data/objects_info.yaml' ({e}). SK-42 определение будет пропущено.")
+                "Не удалось загрузить 'data/objects_info.yaml' (%s). SK-42 определение будет пропущено.", e)
             return {}
 
     # Fallback: legacy JSON (for backward compatibility during migration)
@@ -264,11 +290,11 @@ def _load_objects_info(path: str = "data/objects_info.yaml") -> Dict[str, List[s
                 _write_objects_info_yaml(legacy, yaml_path)
                 logger.info("Преобразовал 'objects_info.json' -> 'objects_info.yaml' (блоковые скаляры).")
             except Exception as conv_err:
-                logger.warning(f"Не удалось автоконвертировать JSON в YAML: {conv_err}")
+                logger.warning("Не удалось автоконвертировать JSON в YAML: %s", conv_err)
             return legacy
         except Exception as e:
             logger.warning(
-                f"Не удалось загрузить 'data/objects_info.json' ({e}). SK-42 определение будет пропущено.")
+                "Не удалось загрузить 'data/objects_info.json' (%s). SK-42 определение будет пропущено.", e)
             return {}
 
     logger.warning(
@@ -276,27 +302,38 @@ def _load_objects_info(path: str = "data/objects_info.yaml") -> Dict[str, List[s
     return {}
 
 
+@lru_cache(maxsize=1)
+def _objects_info_index() -> Dict[str, str]:
+    """Индекс «нормализованная строка → ключ системы координат» по objects_info.yaml.
+
+    Строится один раз; при повторах строки побеждает первый ключ, как и при линейном поиске.
+    """
+    index: Dict[str, str] = {}
+    for system_key, entries in _load_objects_info().items():
+        for s in entries:
+            index.setdefault(_normalize_text_for_exact_match(s), system_key)
+    return index
+
+
 def _detect_system_key_for_string(coord_str: str) -> Optional[str]:
     """Возвращает ключ системы координат из objects_info.yaml, если найдено точное совпадение строки.
 
     Сравнение выполняется по нормализованным строкам, чтобы игнорировать различия
     в количествах пробелов и переносах в блоковых скалярах YAML.
     """
-    info = _load_objects_info()
-    coord_trimmed = _normalize_text_for_exact_match(coord_str)
-    for system_key, entries in info.items():
-        for s in entries:
-            if _normalize_text_for_exact_match(s) == coord_trimmed:
-                return system_key
-    return None
+    return _objects_info_index().get(_normalize_text_for_exact_match(coord_str))
 
 
 def transform_points_sk42_to_wgs84(points: List[Point]) -> List[Point]:
+    if not points:
+        return []
     transformer = _get_sk42_transformer()
+    # Все точки преобразуются одним вызовом PROJ.
+    # В pipeline ожидается порядок (lat, lon) и возвращает (lat, lon)
+    lats_wgs, lons_wgs = transformer.transform(
+        [p.lat for p in points], [p.lon for p in points])
     transformed: List[Point] = []
-    for p in points:
-        # В pipeline ожидается порядок (lat, lon) и возвращает (lat, lon)
-        lat_wgs, lon_wgs = transformer.transform(p.lat, p.lon)
+    for p, lat_wgs, lon_wgs in zip(points, lats_wgs, lons_wgs):
         if not _validate_wgs84_range(lat_wgs, lon_wgs):
             raise ParseError(
                 f"Координаты после преобразования СК-42→WGS84 вне диапазона (lat={lat_wgs}, lon={lon_wgs}).")
@@ -319,7 +356,7 @@ def parse_coordinates(
         return []
 
     coord_str = coord_str.strip()
-    logger.debug(f"1. Исходная строка после удаления пробелов: '{coord_str}'")
+    logger.debug("1. Исходная строка после удаления пробелов: '%s'", coord_str)
 
     if not coord_str:
         logger.debug(
@@ -332,7 +369,7 @@ def parse_coordinates(
     system_key = _detect_system_key_for_string(coord_str)
     if system_key:
         logger.debug(
-            f"  - Строка найдена в 'objects_info.yaml'. Система координат: '{system_key}'.")
+            "  - Строка найдена в 'objects_info.yaml'. Система координат: '%s'.", system_key)
         # Сейчас поддерживаем только СК-42
         if system_key.strip().upper() == "СК-42":
             logger.debug("    - Применяем преобразование СК-42→WGS84.")
@@ -344,45 +381,48 @@ def parse_coordinates(
                 is_anomalous, reason, _ = detect_coordinate_anomalies(
                     transformed_points, threshold_km=config.anomaly_threshold_km)
                 if is_anomalous:
-                    logger.warning(f"  - Детектор аномалий сообщил: {reason}")
+                    logger.warning("  - Детектор аномалий сообщил: %s", reason)
                     raise ParseError(reason)
             logger.debug(
-                f"7. Парсинг СК-42 успешно завершен. Найдено {len(transformed_points)} валидных координат.")
+                "7. Парсинг СК-42 успешно завершен. Найдено %d валидных координат.", len(transformed_points))
             return transformed_points
         else:
             logger.debug(
                 "    - Для данной системы координат преобразование пока не настроено. Продолжаем обычный разбор.")
 
+    # Наличие маркера ДМС определяется один раз и используется обеими ветками ниже
+    has_degree = '°' in coord_str
+
     if _should_prioritize_dms(coord_str):
         logger.debug("  - Обнаружен маркер 'гск'. Приоритет ДМС.")
     else:
-        if looks_like_msk(coord_str):
+        if not has_degree and MSK_HINT_PATTERN.search(coord_str):
             logger.debug("  - Кандидат на МСК-формат. Попытка парсинга МСК.")
             if transformers is None:
                 try:
                     transformers = get_transformers(proj4_path)
                 except Exception:
                     reason = "Не удалось загрузить описания проекций для МСК."
-                    logger.warning(f"{reason} Строка: '{coord_str[:50]}'")
+                    logger.warning("%s Строка: '%s'", reason, coord_str[:50])
                     raise ParseError(reason)
             for key, transformer in transformers.items():
                 if key in coord_str:
-                    logger.debug(f"    - Найдена система координат: '{key}'.")
+                    logger.debug("    - Найдена система координат: '%s'.", key)
                     msk_points = parse_msk_coordinates(coord_str, transformer)
                     if msk_points and len(msk_points) >= 3:
                         is_anomalous, a_reason, _ = detect_coordinate_anomalies(
                             msk_points, threshold_km=config.anomaly_threshold_km)
                         if is_anomalous:
                             logger.warning(
-                                f"  - Детектор аномалий сообщил: {a_reason}")
+                                "  - Детектор аномалий сообщил: %s", a_reason)
                             raise ParseError(a_reason)
                     return msk_points
             reason = "Обнаружены координаты 'м.', но не найдена известная система координат МСК в строке."
-            logger.warning(f"{reason} Строка: '{coord_str[:50]}'")
+            logger.warning("%s Строка: '%s'", reason, coord_str[:50])
             raise ParseError(reason)
 
     logger.debug("3. Проверка на наличие маркера ДМС ('°')...")
-    if '°' not in coord_str:
+    if not has_degree:
         logger.debug(
             "  - Маркер '°' не найден. Предполагается, что в строке нет координат. Возвращаем пустой результат.")
         return []
@@ -394,9 +434,9 @@ def parse_coordinates(
         is_anomalous, reason, _ = detect_coordinate_anomalies(
             dms_points, threshold_km=config.anomaly_threshold_km)
         if is_anomalous:
-            logger.warning(f"  - Детектор аномалий сообщил: {reason}")
+            logger.warning("  - Детектор аномалий сообщил: %s", reason)
             raise ParseError(reason)
 
     logger.debug(
-        f"7. Парсинг успешно завершен. Найдено {len(dms_points)} валидных координат.")
+        "7. Парсинг успешно завершен. Найдено %d валидных координат.", len(dms_points))
     return dms_points
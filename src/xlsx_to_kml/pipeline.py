@@ -1,7 +1,9 @@
 import logging
 import os
+import re
 import time
-from typing import List, Optional, Tuple
+from functools import lru_cache
+from typing import List, Optional, Pattern, Tuple
 
 import simplekml
 from openpyxl import Workbook
@@ -14,13 +16,38 @@ from src.config import Config
 from .models import ConversionResult, Point, ParseError, WaterUsageType, get_water_usage_type, generate_point_name
 from .parsing import parse_coordinates
 from .io_excel import get_column_indices
-from .io_kml import create_kml_point, create_kml_line, create_kml_polygon
+from .io_kml import create_kml_point, create_kml_line, create_kml_polygon, kml_style_from_config, save_kml
 
 logger = logging.getLogger(__name__)
 
-
-def save_anomalies_to_excel(anomalies: List[dict], original_basename: str, output_directory: str) -> bool:
-    """Saves detected anomalies to a separate Excel file in the specified output directory. Returns True on success, False otherwise."""
+# Columns shown in the placemark description, in display order
+_DESCRIPTION_FIELDS = (
+    ("organ", "Уполномоченный орган"),
+    ("additional_name", "Наименование водного объекта"),
+    ("goal", "Цель водопользования"),
+    ("vid", "Вид водопользования"),
+    ("owner", "Владелец"),
+    ("inn", "ИНН"),
+    ("start_date", "Дата начала водопользования"),
+    ("end_date", "Дата окончания водопользования"),
+    ("coord", "Место водопользования"),
+)
+_DATE_FIELDS = frozenset({"start_date", "end_date"})
+
+
+@lru_cache(maxsize=8)
+def _compile_skip_terms(skip_terms: Tuple[str, ...]) -> Optional[Pattern[str]]:
+    """Builds one alternation pattern for all skip terms (None when there are no terms)."""
+    if not skip_terms:
+        return None
+    return re.compile("|".join(re.escape(term) for term in skip_terms))
+
+
+def save_anomalies_to_excel(anomalies: List[Tuple], original_basename: str, output_directory: str) -> bool:
+    """Saves detected anomalies to a separate Excel file in the specified output directory. Returns True on success, False otherwise.
+
+    Each anomaly is a (row_index, main_name, reason, coords_str) tuple, i.e. already a sheet row.
+    """
     if not anomalies:
         return False
 
@@ -28,51 +55,36 @@ def save_anomalies_to_excel(anomalies: List[dict], original_basename: str, outpu
     output_filename = f"ANO_{name}.xlsx"
     output_path = os.path.join(output_directory, output_filename)
 
-    logger.info(f"Saving {len(anomalies)} anomalies to '{output_path}'...")
-
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Anomalies"
+    logger.info("Saving %d anomalies to '%s'...", len(anomalies), output_path)
 
     headers = ["Строка в оригинальном файле", "№ п/п", "Причина", "Координаты"]
-    ws.append(headers)
+    # A write-only sheet streams rows straight to disk, but its column widths
+    # must be known before the first append, so they are measured up front.
+    max_lengths = [len(header) for header in headers]
+    for row_values in anomalies:
+        for col_idx, value in enumerate(row_values):
+            if value is not None:
+                value_len = len(str(value))
+                if value_len > max_lengths[col_idx]:
+                    max_lengths[col_idx] = value_len
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Anomalies")
+    for col_idx, max_length in enumerate(max_lengths, start=1):
+        ws.column_dimensions[get_column_letter(col_idx)].width = min(
+            max_length + 2, 64)
 
-    for anomaly in anomalies:
-        ws.append([
-            anomaly.get("row_index", "N/A"),
-            anomaly.get("main_name", "N/A"),
-            anomaly.get("reason", "N/A"),
-            anomaly.get("coords_str", "N/A"),
-        ])
-
-    for col_idx, col in enumerate(
-        ws.iter_cols(min_row=1, max_row=ws.max_row,
-                     min_col=1, max_col=ws.max_column),
-        start=1,
-    ):
-        max_length = 0
-        column_letter = get_column_letter(col_idx)
-        for cell in col:
-            if cell.value is not None:
-                try:
-                    value_str = str(cell.value)
-                    if len(value_str) > max_length:
-                        max_length = len(value_str)
-                except Exception as e:
-                    logger.warning(
-                        f"Could not determine length for cell value {cell.value} in column {column_letter}: {e}")
-        adjusted_width = (max_length + 2)
-        if adjusted_width > 64:
-            adjusted_width = 64
-        ws.column_dimensions[column_letter].width = adjusted_width
+    ws.append(headers)
+    for row_values in anomalies:
+        ws.append(row_values)
 
     try:
         wb.save(output_path)
-        logger.info(f"Anomalies successfully saved to '{output_path}'.")
+        logger.info("Anomalies successfully saved to '%s'.", output_path)
         return True
     except Exception as e:
         logger.error(
-            f"Failed to save anomalies to '{output_path}': {e}", exc_info=True)
+            "Failed to save anomalies to '%s': %s", output_path, e, exc_info=True)
         print(
             f"[bold red]Ошибка при сохранении файла аномалий '{output_path}': {e}[/bold red]")
         return False
@@ -98,51 +110,61 @@ def create_kml_from_coordinates(
         filename=filename or os.path.basename(output_file))
     kml = simplekml.Kml()
     indices = get_column_indices(sheet, config=config)
-    anomalies_list: List[dict] = []
+    anomalies_list: List[Tuple] = []
+
+    # Column positions and per-sheet settings do not change from row to row
+    coord_idx = indices["coord"]
+    name_idx = indices["name"]
+    goal_idx = indices["goal"]
+    skip_terms_pattern = _compile_skip_terms(tuple(config.pipeline_skip_terms))
+    kml_style = kml_style_from_config(config)
+    # Rows are read only up to the last column that is actually used
+    used_columns = [idx for idx in indices.values() if idx != -1]
+    max_col = max(used_columns) + 1 if used_columns else None
+    # Only the description columns actually present in this sheet are visited per row
+    description_plan = [
+        (indices[key], column_name, key in _DATE_FIELDS)
+        for key, column_name in _DESCRIPTION_FIELDS
+        if indices[key] != -1
+    ]
 
     min_row = config.excel_default_data_start_row
-    for row in sheet.iter_rows(min_row=config.excel_header_scan_min_row, max_row=config.excel_header_scan_max_row):
-        cell = row[indices["coord"]] if indices["coord"] != -1 else None
+    for row in sheet.iter_rows(min_row=config.excel_header_scan_min_row, max_row=config.excel_header_scan_max_row,
+                               max_col=max_col):
+        cell = row[coord_idx] if coord_idx != -1 else None
         value = cell.value
         if isinstance(value, str) and ('м.' in value or '"' in value):
             min_row = cell.row
             break
 
-    # For demo mode, calculate how many rows to process
-    rows_limit = None
+    rows = enumerate(sheet.iter_rows(
+        min_row=min_row, max_col=max_col, values_only=True), start=min_row)
+
+    # Demo mode takes the first X% of the data rows. The sheet is read once: the
+    # data rows are kept while counting them, instead of a separate counting pass.
     if demo_percentage is not None:
-        # First, count total data rows
-        total_data_rows = 0
-        for row in sheet.iter_rows(min_row=min_row, values_only=True):
-            coords_str = row[indices["coord"]
-                             ] if indices["coord"] != -1 else None
-            if isinstance(coords_str, str) and coords_str.strip():
-                total_data_rows += 1
+        data_rows = []
+        if coord_idx != -1:
+            for row_idx, row in rows:
+                coords_str = row[coord_idx]
+                if isinstance(coords_str, str) and coords_str.strip():
+                    data_rows.append((row_idx, row))
 
         # Calculate limit (take first X% of rows)
-        rows_limit = max(1, int(total_data_rows * demo_percentage / 100))
+        rows_limit = max(1, int(len(data_rows) * demo_percentage / 100))
         file_logger.info(
-            f"Demo mode: processing first {rows_limit} out of {total_data_rows} rows ({demo_percentage}%)")
+            "Demo mode: processing first %d out of %d rows (%s%%)", rows_limit, len(data_rows), demo_percentage)
+        rows = iter(data_rows[:rows_limit])
 
-    processed_data_rows = 0
-    for row_idx, row in enumerate(sheet.iter_rows(min_row=min_row, values_only=True), start=min_row):
-        coords_str = row[indices["coord"]] if indices["coord"] != -1 else None
+    for row_idx, row in rows:
+        coords_str = row[coord_idx] if coord_idx != -1 else None
         if not isinstance(coords_str, str) or not coords_str.strip():
             continue
 
-        # Check demo mode limit
-        if rows_limit is not None:
-            if processed_data_rows >= rows_limit:
-                file_logger.info(
-                    f"Demo mode: reached limit of {rows_limit} rows, stopping processing")
-                break
-            processed_data_rows += 1
-
         stats.total_rows += 1
 
-        main_name = row[indices["name"]
-                        ] if indices["name"] != -1 else f"Row {row_idx}"
-        file_logger.info(f"------------")
+        main_name = row[name_idx] if name_idx != -1 else f"Row {row_idx}"
+        file_logger.info("------------")
 
         try:
             coords_array: List[Point] = parse_coordinates(
@@ -151,100 +173,81 @@ def create_kml_from_coordinates(
         except ParseError as e:
             error_reason = str(e)
             file_logger.warning(
-                f"Строка {row_idx} (№ п/п {main_name}) пропущена из-за ошибки парсинга: {error_reason}")
+                "Строка %d (№ п/п %s) пропущена из-за ошибки парсинга: %s", row_idx, main_name, error_reason)
 
             stats.failed_rows += 1
-            stats.error_reasons.append(error_reason)
-            anomalies_list.append({
-                "row_index": row_idx,
-                "main_name": main_name,
-                "reason": error_reason,
-                "coords_str": coords_str,
-            })
+            stats.error_reasons[error_reason] += 1
+            anomalies_list.append(
+                (row_idx, main_name, error_reason, coords_str))
             continue
 
         if not coords_array:
             file_logger.debug(
-                f"Строка {row_idx} (№ п/п {main_name}) не содержит валидных координат для KML.")
+                "Строка %d (№ п/п %s) не содержит валидных координат для KML.", row_idx, main_name)
             stats.successful_rows += 1
             continue
 
         stats.successful_rows += 1
         file_logger.info(
-            f"Строка {row_idx} (№ п/п {main_name}): Распознано {len(coords_array)} точек.")
-
-        if coords_array:
-            color = generate_random_color()
-
-            desc_parts: List[str] = []
-            for key, column_name in [
-                ("organ", "Уполномоченный орган"),
-                ("additional_name", "Наименование водного объекта"),
-                ("goal", "Цель водопользования"),
-                ("vid", "Вид водопользования"),
-                ("owner", "Владелец"),
-                ("inn", "ИНН"),
-                ("start_date", "Дата начала водопользования"),
-                ("end_date", "Дата окончания водопользования"),
-                ("coord", "Место водопользования"),
-            ]:
-                if indices[key] != -1 and row[indices[key]]:
-                    if key in ["start_date", "end_date"] and hasattr(row[indices[key]], "date"):
-                        date_value = row[indices[key]].date()
-                        desc_parts.append(f"{column_name}: {date_value}")
-                    elif key in ["start_date", "end_date"] and isinstance(row[indices[key]], str):
-                        date_str = row[indices[key]].split(" ")[0]
-                        desc_parts.append(f"{column_name}: {date_str}")
-                    else:
-                        desc_parts.append(
-                            f"{column_name}: {row[indices[key]]}")
-
-            description = "\n".join(desc_parts)
-            description += "\n == Разработано RUDI.ru =="
-
-            # Определяем тип водопользования один раз
-            goal_text = row[indices["goal"]] if indices["goal"] != -1 else ""
-            water_type = get_water_usage_type(goal_text)
-
-            skip_terms = config.pipeline_skip_terms
-
-            # Проверяем, можно ли создать полигон
-            if len(coords_array) > 3 and not any(term in goal_text for term in skip_terms):
-                file_logger.debug(
-                    f"Строка {row_idx} (№ п/п {main_name}): Создание полигона")
-
-                if (sort_numbers and int(main_name) in sort_numbers) or len(coords_array) == 4:
-                    sorted_coords = sort_coordinates(
-                        [(p.lon, p.lat) for p in coords_array])
+            "Строка %d (№ п/п %s): Распознано %d точек.", row_idx, main_name, len(coords_array))
+
+        color = generate_random_color()
+
+        desc_parts: List[str] = []
+        for col_idx, column_name, is_date in description_plan:
+            value = row[col_idx]
+            if value:
+                if is_date and hasattr(value, "date"):
+                    desc_parts.append(f"{column_name}: {value.date()}")
+                elif is_date and isinstance(value, str):
+                    desc_parts.append(f"{column_name}: {value.split(' ')[0]}")
                 else:
-                    sorted_coords = [(p.lon, p.lat) for p in coords_array]
+                    desc_parts.append(f"{column_name}: {value}")
 
-                create_kml_polygon(
-                    kml, name=f"№ п/п {main_name}", coords=sorted_coords, description=description, color=color, config=config)
+        description = "\n".join(desc_parts)
+        description += "\n == Разработано RUDI.ru =="
 
-                # Проверяем, можно ли создать линию (только для прочих типов водопользования)
-            elif (len(coords_array) > 2
-                  and all(p.name.startswith("точка") for p in coords_array)
-                  and water_type == WaterUsageType.OTHER):
-                file_logger.debug(
-                    f"Строка {row_idx} (№ п/п {main_name}): Создание линии")
-                create_kml_line(kml, name=f"№ п/п {main_name}", coords=[
-                                (p.lon, p.lat) for p in coords_array], description=description, color=color, config=config)
+        # Определяем тип водопользования один раз
+        goal_text = row[goal_idx] if goal_idx != -1 else ""
+        water_type = get_water_usage_type(goal_text)
+        lon_lat = [(lon, lat) for _, lon, lat in coords_array]
 
-            # Создаем отдельные точки
+        # Проверяем, можно ли создать полигон
+        is_skipped_goal = (skip_terms_pattern is not None and bool(goal_text)
+                           and skip_terms_pattern.search(str(goal_text)) is not None)
+        if len(coords_array) > 3 and not is_skipped_goal:
+            file_logger.debug(
+                "Строка %d (№ п/п %s): Создание полигона", row_idx, main_name)
+
+            if (sort_numbers and int(main_name) in sort_numbers) or len(coords_array) == 4:
+                sorted_coords = sort_coordinates(lon_lat)
             else:
-                index = 1
-                for p in coords_array:
-                    file_logger.debug(
-                        f"  Точка: {p.name} ({p.lat}, {p.lon})")
-
-                    full_name = generate_point_name(
-                        main_name, water_type, index, p.name)
-                    create_kml_point(
-                        kml, full_name, (p.lon, p.lat), description, color, config=config)
-                    index += 1
-
-    kml.save(output_file)
+                sorted_coords = lon_lat
+
+            create_kml_polygon(
+                kml, name=f"№ п/п {main_name}", coords=sorted_coords, description=description, color=color, style=kml_style)
+
+            # Проверяем, можно ли создать линию (только для прочих типов водопользования)
+        elif (len(coords_array) > 2
+              and all(name.startswith("точка") for name, _, _ in coords_array)
+              and water_type == WaterUsageType.OTHER):
+            file_logger.debug(
+                "Строка %d (№ п/п %s): Создание линии", row_idx, main_name)
+            create_kml_line(kml, name=f"№ п/п {main_name}", coords=lon_lat,
+                            description=description, color=color, style=kml_style)
+
+        # Создаем отдельные точки
+        else:
+            for index, (point_name, lon, lat) in enumerate(coords_array, start=1):
+                file_logger.debug(
+                    "  Точка: %s (%s, %s)", point_name, lat, lon)
+
+                full_name = generate_point_name(
+                    main_name, water_type, index, point_name)
+                create_kml_point(
+                    kml, full_name, (lon, lat), description, color, style=kml_style)
+
+    save_kml(kml, output_file)
 
     if anomalies_list and output_file:
         output_dir = os.path.dirname(output_file) or '.'
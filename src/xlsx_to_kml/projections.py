@@ -10,7 +10,16 @@ logger = logging.getLogger(__name__)
 
 
 def create_transformer(proj4_str: str) -> Transformer:
-    """Создает трансформер из заданной строки Proj4 в WGS84."""
+    """Создает трансформер из заданной строки Proj4 в WGS84.
+
+    Трансформеры кэшируются по строке Proj4 (без краевых пробелов): настройка
+    конвейера PROJ дорогая, а одна и та же проекция запрашивается многократно.
+    """
+    return _create_transformer_cached(proj4_str.strip())
+
+
+@lru_cache(maxsize=128)
+def _create_transformer_cached(proj4_str: str) -> Transformer:
     crs = CRS.from_proj4(proj4_str)
     return Transformer.from_crs(crs, "EPSG:4326", always_xy=True)
 
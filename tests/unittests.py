@@ -1,5 +1,11 @@
+import os
+import tempfile
 import unittest
+
+import openpyxl
+
 from src.xlsx_to_kml import parse_coordinates, ParseError, Point
+from src.separator import read_sheet_layout, region_rows_xml, sanitize_filename
 import logging
 
 
@@ -237,6 +243,50 @@ class TestParseCoordinates(unittest.TestCase):
             "Координаты ДМС вне допустимого диапазона WGS84", str(cm2.exception))
 
 
+class TestSanitizeFilename(unittest.TestCase):
+
+    def test_invalid_characters_and_whitespace(self):
+        self.assertEqual(sanitize_filename('  Енисейское  БВУ: "Красноярский"\tкрай  '),
+                         'Енисейское БВУ_ _Красноярский_ край')
+
+    def test_underscores_collapsed_and_stripped(self):
+        self.assertEqual(sanitize_filename('<<a//b>>'), 'a_b')
+
+    def test_empty_name(self):
+        self.assertEqual(sanitize_filename(' ?*| '), 'unnamed')
+
+
+class TestRegionRowsXml(unittest.TestCase):
+
+    def test_cells_written_like_openpyxl(self):
+        self.assertEqual(region_rows_xml([(1, None, ' a&b ', True)], 6, {}),
+                         '<row r="6"><c r="A6" t="n"><v>1</v></c>'
+                         '<c r="C6" t="inlineStr"><is><t xml:space="preserve"> a&amp;b </t></is></c>'
+                         '<c r="D6" t="b"><v>1</v></c></row>')
+
+    def test_values_only_openpyxl_writes(self):
+        self.assertIsNone(region_rows_xml([('=SUM(A1:A2)',)], 6, {}))
+        self.assertIsNone(region_rows_xml([('#N/A',)], 6, {}))
+
+
+class TestReadSheetLayout(unittest.TestCase):
+
+    def test_column_ranges_and_merges(self):
+        wb = openpyxl.Workbook()
+        wb.create_sheet('Данные')
+        ws = wb['Данные']
+        ws['A1'] = 'x'
+        ws.merge_cells('A1:C1')
+        dimension = ws.column_dimensions['B']
+        dimension.width, dimension.min, dimension.max = 40, 2, 5
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'layout.xlsx')
+            wb.save(path)
+            merged_ranges, col_widths = read_sheet_layout(path, 'Данные')
+            self.assertEqual(read_sheet_layout(path, 'Нет такого листа'), ([], []))
+        self.assertEqual([str(rng) for rng in merged_ranges], ['A1:C1'])
+        self.assertEqual(col_widths, [(2, 5, 40.0)])
+
 if __name__ == '__main__':
     # You must have 'data/proj4.json' for these tests to run correctly.
     # The 'xlsx_to_kml.py' module loads it on import.